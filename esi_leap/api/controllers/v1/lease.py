@@ -23,7 +23,6 @@ from esi_leap.api.controllers import base
 from esi_leap.api.controllers import types
 from esi_leap.api.controllers.v1 import utils
 from esi_leap.common import exception
-from esi_leap.common import keystone
 from esi_leap.common import policy
 from esi_leap.common import statuses
 import esi_leap.conf
@@ -86,10 +85,10 @@ class LeasesController(rest.RestController):
         cdict = request.to_policy_values()
 
         if project_id is not None:
-            project_id = keystone.get_project_uuid_from_ident(project_id)
+            project_id = utils.get_project_uuid_from_ident(request, project_id)
 
         if owner_id is not None:
-            owner_id = keystone.get_project_uuid_from_ident(owner_id)
+            owner_id = utils.get_project_uuid_from_ident(request, owner_id)
 
         if resource_uuid is not None:
             if resource_type is None:
@@ -129,8 +128,8 @@ class LeasesController(rest.RestController):
         lease_dict['resource_uuid'] = resource.get_resource_uuid()
 
         if 'project_id' in lease_dict:
-            lease_dict['project_id'] = keystone.get_project_uuid_from_ident(
-                lease_dict['project_id'])
+            lease_dict['project_id'] = utils.get_project_uuid_from_ident(
+                request, lease_dict['project_id'])
 
         if 'start_time' not in lease_dict:
             lease_dict['start_time'] = datetime.datetime.now()
@@ -220,9 +219,7 @@ class LeasesController(rest.RestController):
                                                   start_time=str(start_time),
                                                   end_time=str(end_time))
 
-        filters = {}
-        for k, v in possible_filters.items():
-            if v is not None:
-                filters[k] = v
+        filters = {k: v for k, v in possible_filters.items()
+                   if v is not None}
 
         return filters
@@ -25,7 +25,6 @@ from esi_leap.api.controllers import types
 from esi_leap.api.controllers.v1 import lease
 from esi_leap.api.controllers.v1 import utils
 from esi_leap.common import exception
-from esi_leap.common import keystone
 from esi_leap.common import policy
 from esi_leap.common import statuses
 import esi_leap.conf
@@ -101,7 +100,7 @@ class OffersController(rest.RestController):
         policy.authorize('esi_leap:offer:get', cdict, cdict)
 
         if project_id is not None:
-            project_id = keystone.get_project_uuid_from_ident(project_id)
+            project_id = utils.get_project_uuid_from_ident(request, project_id)
 
         if resource_uuid is not None:
             if resource_type is None:
@@ -158,17 +157,16 @@ class OffersController(rest.RestController):
             'available_end_time': available_end_time,
         }
 
-        filters = {}
-        for k, v in possible_filters.items():
-            if v is not None:
-                filters[k] = v
+        filters = {k: v for k, v in possible_filters.items()
+                   if v is not None}
 
         offer_collection = OfferCollection()
-        offers = offer_obj.Offer.get_all(filters, request)
+        offers = offer_obj.Offer.get_all_with_conflict_times(filters,
+                                                             request)
 
         offer_collection.offers = [
-            Offer(**OffersController._add_offer_availabilities(o))
-            for o in offers]
+            Offer(**OffersController._add_offer_availabilities(o, conflicts))
+            for o, conflicts in offers]
         return offer_collection
 
     @wsme_pecan.wsexpose(Offer, body=Offer, status_code=http_client.CREATED)
@@ -188,8 +186,8 @@ class OffersController(rest.RestController):
         offer_dict['resource_uuid'] = resource.get_resource_uuid()
 
         if 'lessee_id' in offer_dict:
-            offer_dict['lessee_id'] = keystone.get_project_uuid_from_ident(
-                offer_dict['lessee_id'])
+            offer_dict['lessee_id'] = utils.get_project_uuid_from_ident(
+                request, offer_dict['lessee_id'])
 
         if 'start_time' not in offer_dict:
             offer_dict['start_time'] = datetime.datetime.now()
@@ -259,8 +257,8 @@ class OffersController(rest.RestController):
         return lease.Lease(**new_lease.to_dict())
 
     @staticmethod
-    def _add_offer_availabilities(o):
-        availabilities = o.get_availabilities()
+    def _add_offer_availabilities(o, conflicts=None):
+        availabilities = o.get_availabilities(conflicts)
         o = o.to_dict()
         o['availabilities'] = availabilities
         return o
@@ -125,10 +125,8 @@ class OwnerChangesController(rest.RestController):
             'end_time': end_time,
         }
 
-        filters = {}
-        for k, v in possible_filters.items():
-            if v is not None:
-                filters[k] = v
+        filters = {k: v for k, v in possible_filters.items()
+                   if v is not None}
 
         oc_collection = OwnerChangeCollection()
         ocs = owner_change_obj.OwnerChange.get_all(filters, request)
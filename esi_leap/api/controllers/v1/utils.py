@@ -21,6 +21,17 @@ from esi_leap.objects import offer as offer_obj
 from esi_leap.resource_objects import resource_object_factory as ro_factory
 
 
+def get_project_uuid_from_ident(context, project_ident):
+    """Resolve a project identifier, at most once per request context."""
+    cache = getattr(context, '_project_uuid_cache', None)
+    if cache is None:
+        cache = context._project_uuid_cache = {}
+    if project_ident not in cache:
+        cache[project_ident] = keystone.get_project_uuid_from_ident(
+            project_ident)
+    return cache[project_ident]
+
+
 def get_offer_authorized(uuid_or_name, cdict, status_filter=None):
     if uuidutils.is_uuid_like(uuid_or_name):
         o = offer_obj.Offer.get(uuid_or_name)
@@ -0,0 +1,55 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+
+
+class IntervalSet(object):
+    """A union of time intervals.
+
+    Intervals may be passed in any order and may overlap; they are merged
+    into sorted, disjoint runs once, on construction.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for start, end in sorted(intervals):
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def complement(self, lo, hi):
+        """Return the gaps in [lo, hi] not covered by the set.
+
+        :returns: A list of [start, end] pairs in ascending order.
+        """
+        gaps = []
+        cursor = lo
+        # the runs are disjoint, so their ends are sorted as well
+        i = bisect.bisect_right(self._ends, lo)
+        while i < len(self._starts) and self._starts[i] < hi:
+            if self._starts[i] > cursor:
+                gaps.append([cursor, self._starts[i]])
+            cursor = max(cursor, self._ends[i])
+            i += 1
+        if cursor < hi:
+            gaps.append([cursor, hi])
+        return gaps
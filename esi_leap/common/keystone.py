@@ -10,6 +10,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
+import cachetools
+from keystoneauth1 import exceptions as ks_exception
 from keystoneauth1 import loading as ks_loading
 from keystoneclient import client as keystone_client
 from oslo_utils import uuidutils
@@ -21,6 +25,11 @@ import esi_leap.conf
 CONF = esi_leap.conf.CONF
 _cached_keystone_client = None
 
+# parent project trees rarely change, so cache them rather than walking
+# the project hierarchy in keystone on every request
+_project_tree_cache = cachetools.TTLCache(maxsize=4096, ttl=300)
+_project_tree_cache_lock = threading.Lock()
+
 
 def get_keystone_client():
     global _cached_keystone_client
@@ -37,11 +46,25 @@ def get_keystone_client():
 
 
 def get_parent_project_id_tree(project_id):
-    project = get_keystone_client().projects.get(project_id)
-    project_ids = [project.id]
-    while project.parent_id is not None:
-        project = get_keystone_client().projects.get(project.parent_id)
-        project_ids.append(project.id)
+    with _project_tree_cache_lock:
+        project_ids = _project_tree_cache.get(project_id)
+    if project_ids is not None:
+        return list(project_ids)
+
+    try:
+        project = get_keystone_client().projects.get(project_id)
+        project_ids = [project.id]
+        while project.parent_id is not None:
+            project = get_keystone_client().projects.get(project.parent_id)
+            project_ids.append(project.id)
+    except (ks_exception.Unauthorized, ks_exception.Forbidden):
+        # our view of keystone may be out of date; drop everything cached
+        with _project_tree_cache_lock:
+            _project_tree_cache.clear()
+        raise
+
+    with _project_tree_cache_lock:
+        _project_tree_cache[project_id] = tuple(project_ids)
     return project_ids
 
 
@@ -92,6 +92,10 @@ def offer_get_conflict_times(offer_ref):
     return IMPL.offer_get_conflict_times(offer_ref)
 
 
+def offer_get_all_with_conflict_times(filters):
+    return IMPL.offer_get_all_with_conflict_times(filters)
+
+
 def offer_get_first_availability(offer_uuid, start, end):
     return IMPL.offer_get_first_availability(
         offer_uuid, start, end)
@@ -102,8 +106,14 @@ def offer_verify_availability(offer_ref, start, end):
         offer_ref, start, end)
 
 
-def offer_create(values):
-    return IMPL.offer_create(values)
+def offer_create(values, verify_availability=False):
+    return IMPL.offer_create(
+        values, verify_availability=verify_availability)
+
+
+def offer_create_many(values_list, verify_availability=False):
+    return IMPL.offer_create_many(
+        values_list, verify_availability=verify_availability)
 
 
 def offer_update(context, offer_uuid, values):
@@ -148,6 +158,11 @@ def resource_verify_availability(r_type, r_uuid, start, end):
         r_type, r_uuid, start, end)
 
 
+def resource_verify_availability_bulk(specs, is_owner_change=False):
+    return IMPL.resource_verify_availability_bulk(
+        specs, is_owner_change=is_owner_change)
+
+
 def resource_check_admin(resource_type, resource_uuid,
                          start_time, end_time,
                          default_admin_project_id, project_id):
@@ -16,8 +16,11 @@ import threading
 from oslo_config import cfg
 from oslo_db.sqlalchemy import enginefacade
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext import baked
 from sqlalchemy import or_
 
 from esi_leap.common import exception
@@ -31,6 +34,14 @@ LOG = logging.getLogger(__name__)
 
 _CONTEXT = threading.local()
 
+# queries built from a lambda are compiled once and cached by the bakery
+_bakery = baked.bakery()
+
+# leases and owner changes in these states hold their resource
+_ACTIVE_STATUSES = (statuses.CREATED, statuses.ACTIVE)
+_LEASE_IS_ACTIVE = models.Lease.status.in_(_ACTIVE_STATUSES)
+_OWNER_CHANGE_IS_ACTIVE = models.OwnerChange.status.in_(_ACTIVE_STATUSES)
+
 
 def get_backend():
     """The backend is this module itself."""
@@ -55,6 +66,11 @@ def model_query(model, *args):
         return query
 
 
+def _get_for_update(session, model, uuid):
+    return session.query(model).with_for_update().\
+        filter_by(uuid=uuid).one_or_none()
+
+
 # Helpers for building constraints / equality checks
 
 
@@ -86,7 +102,7 @@ class EqualityCondition(object):
         self.values = values
 
     def clauses(self, field):
-        return sa.or_([field == value for value in self.values])
+        return [field.in_(self.values)]
 
 
 class InequalityCondition(object):
@@ -94,14 +110,44 @@ class InequalityCondition(object):
         self.values = values
 
     def clauses(self, field):
-        return [field != value for value in self.values]
+        return [field.notin_(self.values)]
+
+
+def _in_values(query, column, values):
+    """Match column against values passed as a single bound parameter.
+
+    A plain IN renders one bind parameter per value, so every distinct
+    list length produces a different statement.
+    """
+    dialect = query.session.get_bind().dialect.name
+    values = list(values)
+    if dialect == 'postgresql':
+        array = sa.bindparam(None, values,
+                             type_=postgresql.ARRAY(sa.String))
+        return column.in_(sa.select([sa.func.unnest(array)]))
+    if dialect == 'sqlite':
+        return column.in_(
+            sa.select([sa.column('value')]).select_from(
+                sa.func.json_each(jsonutils.dumps(values))))
+    return column.in_(values)
+
+
+def _time_overlap(start_col, end_col, start, end):
+    """Match rows whose [start_col, end_col) overlaps [start, end)."""
+    return sa.and_(start_col < end, end_col > start)
 
 
 # Offer
+def _get_by_uuid(model, uuid):
+    # the lambdas are shared by every model, so key the cache on it too
+    query = _bakery(lambda session: session.query(model), model)
+    query += lambda q: q.filter(model.uuid == sa.bindparam('uuid'))
+    with _session_for_read() as session:
+        return query(session).params(uuid=uuid).one_or_none()
+
+
 def offer_get_by_uuid(offer_uuid):
-    query = model_query(models.Offer)
-    offer_ref = query.filter_by(uuid=offer_uuid).one_or_none()
-    return offer_ref
+    return _get_by_uuid(models.Offer, offer_uuid)
 
 
 def offer_get_by_name(name):
@@ -127,7 +173,8 @@ def offer_get_all(filters):
         lessee_id_list = keystone.get_parent_project_id_tree(lessee_id)
         query = query.filter(or_(models.Offer.project_id == lessee_id,
                                  models.Offer.lessee_id.__eq__(None),
-                                 models.Offer.lessee_id.in_(lessee_id_list)))
+                                 _in_values(query, models.Offer.lessee_id,
+                                            lessee_id_list)))
 
     if start and end:
         if time_filter_type == 'within':
@@ -141,13 +188,18 @@ def offer_get_all(filters):
                                  (end <= models.Offer.end_time))
 
     if a_start and a_end:
-        for o in query:
-            try:
-                offer_verify_availability(o, a_start, a_end)
-            except exception.OfferNoTimeAvailabilities:
-                query = query.filter(models.Offer.uuid != o.uuid)
+        conflict_exists = sa.exists().where(sa.and_(
+            models.Lease.offer_uuid == models.Offer.uuid,
+            _LEASE_IS_ACTIVE,
+            _time_overlap(models.Lease.start_time, models.Lease.end_time,
+                          a_start, a_end)
+        )).correlate(models.Offer)
+        query = query.filter(models.Offer.start_time <= a_start,
+                             models.Offer.end_time >= a_end,
+                             ~conflict_exists)
 
-    return query
+    # build rows in batches rather than loading the whole result up front
+    return query.yield_per(200)
 
 
 def offer_get_conflict_times(offer_ref):
@@ -156,25 +208,39 @@ def offer_get_conflict_times(offer_ref):
 
     return l_query.with_entities(
         models.Lease.start_time, models.Lease.end_time).\
-        join(models.Offer).\
         order_by(models.Lease.start_time).\
         filter(models.Lease.offer_uuid == offer_ref.uuid,
-               (models.Lease.status == statuses.CREATED) |
-               (models.Lease.status == statuses.ACTIVE)
-               ).all()
+               _LEASE_IS_ACTIVE).all()
 
 
-def offer_get_first_availability(offer_uuid, start):
-    l_query = model_query(models.Lease)
+def offer_get_all_with_conflict_times(filters):
+    query = offer_get_all(filters).\
+        outerjoin(models.Lease, sa.and_(
+            models.Lease.offer_uuid == models.Offer.uuid,
+            _LEASE_IS_ACTIVE)).\
+        add_columns(models.Lease.start_time, models.Lease.end_time).\
+        order_by(models.Offer.id, models.Lease.start_time)
 
-    return l_query.with_entities(
-        models.Lease.start_time).\
-        filter(models.Lease.offer_uuid == offer_uuid,
-               (models.Lease.status == statuses.CREATED) |
-               (models.Lease.status == statuses.ACTIVE)
-               ).\
+    offers = {}
+    for offer_ref, start, end in query:
+        conflicts = offers.setdefault(offer_ref.uuid, (offer_ref, []))[1]
+        if start is not None:
+            conflicts.append((start, end))
+
+    return list(offers.values())
+
+
+def offer_get_first_availability(offer_uuid, start):
+    stmt = sa.select([models.Lease.start_time]).\
+        where(sa.and_(
+            models.Lease.offer_uuid == offer_uuid,
+            _LEASE_IS_ACTIVE,
+            models.Lease.end_time >= start)).\
         order_by(models.Lease.start_time).\
-        filter(models.Lease.end_time >= start).first()
+        limit(1)
+
+    with _session_for_read() as session:
+        return session.execute(stmt).first()
 
 
 def offer_verify_availability(offer_ref, start, end):
@@ -189,20 +255,11 @@ def offer_verify_availability(offer_ref, start, end):
     leases = l_query.with_entities(
         models.Lease.start_time, models.Lease.end_time).\
         filter((models.Lease.offer_uuid == offer_ref.uuid),
-               (models.Lease.status == statuses.CREATED) |
-               (models.Lease.status == statuses.ACTIVE)
-               )
+               _LEASE_IS_ACTIVE)
 
-    conflict = leases.filter((
-        ((start >= models.Lease.start_time) &
-         (start < models.Lease.end_time)) |
-
-        ((end > models.Lease.start_time) &
-         (end <= models.Lease.end_time)) |
-
-        ((start <= models.Lease.start_time) &
-         (end >= models.Lease.end_time))
-    )).first()
+    conflict = leases.filter(
+        _time_overlap(models.Lease.start_time, models.Lease.end_time,
+                      start, end)).first()
 
     if conflict:
         raise exception.OfferNoTimeAvailabilities(offer_uuid=offer_ref.uuid,
@@ -210,22 +267,35 @@ def offer_verify_availability(offer_ref, start, end):
                                                   end_time=end)
 
 
-def offer_create(values):
-    offer_ref = models.Offer()
-    offer_ref.update(values)
+def offer_create(values, verify_availability=False):
+    return offer_create_many(
+        [values], verify_availability=verify_availability)[0]
+
+
+def offer_create_many(values_list, verify_availability=False):
+    offer_refs = []
+    for values in values_list:
+        offer_ref = models.Offer()
+        offer_ref.update(values)
+        offer_refs.append(offer_ref)
 
     with _session_for_write() as session:
-        session.add(offer_ref)
+        if verify_availability:
+            # the check joins the write transaction, so verifying and
+            # inserting cost one connection checkout and one commit
+            resource_verify_availability_bulk(
+                [(v['resource_type'], v['resource_uuid'],
+                  v['start_time'], v['end_time']) for v in values_list])
+        session.add_all(offer_refs)
         session.flush()
-        return offer_ref
+        return offer_refs
 
 
 def offer_update(offer_uuid, values):
 
     with _session_for_write() as session:
 
-        query = model_query(models.Offer)
-        offer_ref = query.filter_by(uuid=offer_uuid).one_or_none()
+        offer_ref = _get_for_update(session, models.Offer, offer_uuid)
 
         values.pop('uuid', None)
         values.pop('project_id', None)
@@ -248,21 +318,20 @@ def offer_update(offer_uuid, values):
 
 def offer_destroy(offer_uuid):
     with _session_for_write() as session:
-        query = model_query(models.Offer)
-        offer_ref = query.filter_by(uuid=offer_uuid).one_or_none()
+        offer_ref = _get_for_update(session, models.Offer, offer_uuid)
 
         if not offer_ref:
             raise exception.OfferNotFound(offer_uuid=offer_uuid)
 
-        model_query(models.Offer).filter_by(uuid=offer_uuid).delete()
+        # a bulk delete, so that the ORM does not null out offer_uuid on
+        # the offer's leases through the Lease.offer backref
+        session.query(models.Offer).filter_by(uuid=offer_uuid).delete()
         session.flush()
 
 
 # Leases
 def lease_get_by_uuid(lease_uuid):
-    query = model_query(models.Lease)
-    result = query.filter_by(uuid=lease_uuid).one_or_none()
-    return result
+    return _get_by_uuid(models.Lease, lease_uuid)
 
 
 def lease_get_by_name(name):
@@ -316,8 +385,7 @@ def lease_create(values):
 
 def lease_update(lease_uuid, values):
     with _session_for_write() as session:
-        query = model_query(models.Lease)
-        lease_ref = query.filter_by(uuid=lease_uuid).one_or_none()
+        lease_ref = _get_for_update(session, models.Lease, lease_uuid)
 
         values.pop('uuid', None)
         values.pop('project_id', None)
@@ -341,20 +409,17 @@ def lease_update(lease_uuid, values):
 def lease_destroy(lease_uuid):
     with _session_for_write() as session:
 
-        query = model_query(models.Lease)
-        lease_ref = query.filter_by(uuid=lease_uuid).one_or_none()
+        lease_ref = _get_for_update(session, models.Lease, lease_uuid)
 
         if not lease_ref:
             raise exception.LeaseNotFound(lease_uuid=lease_uuid)
-        query.delete()
+        session.delete(lease_ref)
         session.flush()
 
 
 # Owner Changes
 def owner_change_get_by_uuid(owner_change_uuid):
-    query = model_query(models.OwnerChange)
-    result = query.filter_by(uuid=owner_change_uuid).one_or_none()
-    return result
+    return _get_by_uuid(models.OwnerChange, owner_change_uuid)
 
 
 def owner_change_get_all(filters):
@@ -394,9 +459,8 @@ def owner_change_create(values):
 
 def owner_change_update(owner_change_uuid, values):
     with _session_for_write() as session:
-        query = model_query(models.OwnerChange)
-        owner_change_ref = query.filter_by(
-            uuid=owner_change_uuid).one_or_none()
+        owner_change_ref = _get_for_update(
+            session, models.OwnerChange, owner_change_uuid)
 
         values.pop('uuid', None)
         values.pop('from_owner_id', None)
@@ -423,97 +487,85 @@ def owner_change_update(owner_change_uuid, values):
 def owner_change_destroy(owner_change_uuid):
     with _session_for_write() as session:
 
-        query = model_query(models.OwnerChange)
-        owner_change_ref = query.filter_by(
-            uuid=owner_change_uuid).one_or_none()
+        owner_change_ref = _get_for_update(
+            session, models.OwnerChange, owner_change_uuid)
 
         if not owner_change_ref:
             raise exception.OwnerChangeNotFound(
                 owner_change_uuid=owner_change_uuid)
-        query.delete()
+        session.delete(owner_change_ref)
         session.flush()
 
 
 # Resources
-def resource_verify_availability(r_type, r_uuid, start, end,
-                                 is_owner_change=False):
-    # check conflict with offers
-    o_query = model_query(models.Offer)
-
-    offers = o_query.with_entities(
-        models.Offer.start_time, models.Offer.end_time).\
-        filter((models.Offer.resource_uuid == r_uuid),
-               (models.Offer.resource_type == r_type),
-               (models.Offer.status == statuses.AVAILABLE))
+def _resource_conflicts(spec, r_type, r_uuid, start, end, is_owner_change):
+    # one select per kind of record that can hold the resource, each
+    # tagged with the position of the window it was built for
+    tag = sa.literal(spec).label('spec')
 
-    offer_conflict = offers.filter((
-        ((start >= models.Offer.start_time) &
-         (start < models.Offer.end_time)) |
-
-        ((end > models.Offer.start_time) &
-         (end <= models.Offer.end_time)) |
-
-        ((start <= models.Offer.start_time) &
-         (end >= models.Offer.end_time))
-    )).first()
-
-    if offer_conflict:
-        raise exception.ResourceTimeConflict(
-            resource_uuid=r_uuid,
-            resource_type=r_type)
+    # check conflict with offers
+    conflicts = [
+        sa.select([tag]).where(sa.and_(
+            models.Offer.resource_uuid == r_uuid,
+            models.Offer.resource_type == r_type,
+            models.Offer.status == statuses.AVAILABLE,
+            _time_overlap(models.Offer.start_time, models.Offer.end_time,
+                          start, end))),
+    ]
 
     # check conflict with leases
-    l_query = model_query(models.Lease)
+    conflicts.append(
+        sa.select([tag]).where(sa.and_(
+            models.Lease.resource_uuid == r_uuid,
+            models.Lease.resource_type == r_type,
+            _LEASE_IS_ACTIVE,
+            _time_overlap(models.Lease.start_time, models.Lease.end_time,
+                          start, end))))
+
+    # check conflict with ownership changes; for leases and offers
+    # check_resource_admin will have been called earlier
+    if is_owner_change:
+        conflicts.append(
+            sa.select([tag]).where(sa.and_(
+                models.OwnerChange.resource_uuid == r_uuid,
+                models.OwnerChange.resource_type == r_type,
+                _OWNER_CHANGE_IS_ACTIVE,
+                _time_overlap(models.OwnerChange.start_time,
+                              models.OwnerChange.end_time,
+                              start, end))))
+
+    return conflicts
 
-    leases = l_query.with_entities(
-        models.Lease.start_time, models.Lease.end_time).\
-        filter((models.Lease.resource_uuid == r_uuid),
-               (models.Lease.resource_type == r_type),
-               (models.Lease.status.in_([statuses.CREATED, statuses.ACTIVE])))
 
-    lease_conflict = leases.filter((
-        ((start >= models.Lease.start_time) &
-         (start < models.Lease.end_time)) |
-
-        ((end > models.Lease.start_time) &
-         (end <= models.Lease.end_time)) |
+def resource_verify_availability(r_type, r_uuid, start, end,
+                                 is_owner_change=False):
+    resource_verify_availability_bulk([(r_type, r_uuid, start, end)],
+                                      is_owner_change=is_owner_change)
 
-        ((start <= models.Lease.start_time) &
-         (end >= models.Lease.end_time))
-    )).first()
 
-    if lease_conflict:
-        raise exception.ResourceTimeConflict(
-            resource_uuid=r_uuid,
-            resource_type=r_type)
+def resource_verify_availability_bulk(specs, is_owner_change=False):
+    """Check many resource windows for conflicts in one query.
 
-    # check conflict with ownership changes
-    if not is_owner_change:
-        # check_resource_admin will have been called earlier
-        # for leases and offers
+    :param specs: (resource_type, resource_uuid, start, end) tuples.
+    :raises: ResourceTimeConflict for the first conflicting window, in
+        the order given.
+    """
+    conflicts = []
+    for spec, (r_type, r_uuid, start, end) in enumerate(specs):
+        conflicts.extend(_resource_conflicts(
+            spec, r_type, r_uuid, start, end, is_owner_change))
+    if not conflicts:
         return
 
-    oc_query = model_query(models.OwnerChange)
-
-    ocs = oc_query.with_entities(
-        models.OwnerChange.start_time, models.OwnerChange.end_time).\
-        filter((models.OwnerChange.resource_uuid == r_uuid),
-               (models.OwnerChange.resource_type == r_type),
-               (models.OwnerChange.status.in_([statuses.CREATED,
-                                               statuses.ACTIVE])))
-
-    oc_conflict = ocs.filter((
-        ((start >= models.OwnerChange.start_time) &
-         (start < models.OwnerChange.end_time)) |
-
-        ((end > models.OwnerChange.start_time) &
-         (end <= models.OwnerChange.end_time)) |
+    query = sa.union_all(*conflicts)
+    if len(specs) > 1:
+        query = query.order_by(sa.literal_column('spec'))
 
-        ((start <= models.OwnerChange.start_time) &
-         (end >= models.OwnerChange.end_time))
-    )).first()
+    with _session_for_read() as session:
+        conflict = session.execute(query.limit(1)).first()
 
-    if oc_conflict:
+    if conflict:
+        r_type, r_uuid = specs[conflict[0]][:2]
         raise exception.ResourceTimeConflict(
             resource_uuid=r_uuid,
             resource_type=r_type)
@@ -522,44 +574,35 @@ def resource_verify_availability(r_type, r_uuid, start, end,
 def resource_check_admin(resource_type, resource_uuid,
                          start_time, end_time,
                          default_admin_project_id, project_id):
-    # check if time period straddles an owner changes
-    ocs_conflicts = model_query(models.OwnerChange).with_entities(
-        models.OwnerChange.start_time, models.OwnerChange.end_time).\
+    # owner changes on a resource never overlap each other, so any
+    # second one overlapping the window means the window straddles
+    ocs = model_query(models.OwnerChange).with_entities(
+        models.OwnerChange.start_time, models.OwnerChange.end_time,
+        models.OwnerChange.to_owner_id).\
         filter((models.OwnerChange.resource_uuid == resource_uuid),
                (models.OwnerChange.resource_type == resource_type),
-               (models.OwnerChange.status.in_([statuses.CREATED,
-                                               statuses.ACTIVE])))
-
-    ocs_conflicts = ocs_conflicts.filter((
-        ((start_time >= models.OwnerChange.start_time) &
-         (start_time < models.OwnerChange.end_time) &
-         (end_time > models.OwnerChange.end_time)) |
-
-        ((start_time < models.OwnerChange.start_time) &
-         (end_time > models.OwnerChange.start_time) &
-         (end_time < models.OwnerChange.end_time)) |
-
-        ((start_time <= models.OwnerChange.start_time) &
-         (end_time >= models.OwnerChange.end_time))
-    ))
-
-    if ocs_conflicts.count() > 0:
-        return False
-
-    # check if time period encompasses a single owner change
-    filters = {
-        'resource_type': resource_type,
-        'resource_uuid': resource_uuid,
-        'start_time': start_time,
-        'end_time': end_time,
-        'status': [statuses.CREATED, statuses.ACTIVE]
-    }
-    ocs = owner_change_get_all(filters)
-
-    if ocs.count() > 1:
+               _OWNER_CHANGE_IS_ACTIVE,
+               _time_overlap(models.OwnerChange.start_time,
+                             models.OwnerChange.end_time,
+                             start_time, end_time)).\
+        limit(2).all()
+
+    to_owner_ids = []
+    for oc_start, oc_end, to_owner_id in ocs:
+        # check if time period straddles an owner change
+        if ((oc_start <= start_time < oc_end and end_time > oc_end) or
+                (start_time < oc_start < end_time < oc_end) or
+                (start_time <= oc_start and end_time >= oc_end)):
+            return False
+
+        # check if time period is within an owner change
+        if start_time >= oc_start and end_time <= oc_end:
+            to_owner_ids.append(to_owner_id)
+
+    if len(to_owner_ids) > 1:
         # shouldn't happen, but...
         return False
-    if ocs.count() == 1:
-        return project_id == ocs[0].to_owner_id
+    if len(to_owner_ids) == 1:
+        return project_id == to_owner_ids[0]
     # no owner changes; use default check
     return project_id == default_admin_project_id
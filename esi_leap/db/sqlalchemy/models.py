@@ -44,6 +44,8 @@ class Offer(Base):
         Index('offer_project_id_idx', 'project_id'),
         Index('offer_resource_idx', 'resource_type', 'resource_uuid'),
         Index('offer_status_idx', 'status'),
+        Index('offer_resource_status_start_idx', 'resource_uuid',
+              'resource_type', 'status', 'start_time'),
     )
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
@@ -68,6 +70,10 @@ class Lease(Base):
         Index('lease_project_id_idx', 'project_id'),
         Index('lease_owner_id_idx', 'owner_id'),
         Index('lease_status_idx', 'status'),
+        Index('lease_resource_status_start_idx', 'resource_uuid',
+              'resource_type', 'status', 'start_time'),
+        Index('lease_offer_status_start_idx', 'offer_uuid', 'status',
+              'start_time', 'end_time'),
     )
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
@@ -101,6 +107,8 @@ class OwnerChange(Base):
         Index('oc_uuid_idx', 'uuid'),
         Index('oc_from_owner_id_idx', 'from_owner_id'),
         Index('oc_to_owner_id_idx', 'to_owner_id'),
+        Index('oc_resource_status_start_idx', 'resource_uuid',
+              'resource_type', 'status', 'start_time'),
     )
 
     id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
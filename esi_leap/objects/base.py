@@ -31,7 +31,7 @@ class ESILEAPObject(object_base.VersionedObject):
     def _from_db_object(context, obj, db_obj):
         for key in obj.fields:
             setattr(obj, key, db_obj[key])
-            obj.obj_reset_changes()
+        obj.obj_reset_changes()
         obj._context = context
         return obj
 
@@ -10,7 +10,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
+
 from esi_leap.common import exception
+from esi_leap.common import intervals
 from esi_leap.common import statuses
 from esi_leap.common import utils
 from esi_leap.db import api as dbapi
@@ -54,39 +58,39 @@ class Offer(base.ESILEAPObject):
         db_offers = cls.dbapi.offer_get_all(filters)
         return cls._from_db_object_list(context, db_offers)
 
-    def get_availabilities(self):
+    @classmethod
+    def get_all_with_conflict_times(cls, filters, context=None):
+        return [(cls._from_db_object(context, cls(), db_offer), conflicts)
+                for db_offer, conflicts
+                in cls.dbapi.offer_get_all_with_conflict_times(filters)]
+
+    def get_availabilities(self, conflicts=None):
 
         if self.status != statuses.AVAILABLE:
             return []
 
-        conflicts = self.dbapi.offer_get_conflict_times(self)
-
-        if conflicts:
-            a = [self.start_time, conflicts[0][0]]
-            for i in range(len(conflicts) - 1):
-                a.append(conflicts[i][1])
-                a.append(conflicts[i + 1][0])
-            a.append(conflicts[-1][1])
-            a.append(self.end_time)
-
-            i = 0
-            while i < len(a) - 1:
-                if a[i] == a[i + 1]:
-                    a.pop(i)
-                    a.pop(i)
-                else:
-                    i += 1
-
-            a = [[a[j], a[j + 1]] for j in range(0, len(a) - 1, 2)]
+        if conflicts is None:
+            conflicts = self.dbapi.offer_get_conflict_times(self)
 
-        else:
-            a = [[self.start_time, self.end_time]]
-
-        return a
+        return intervals.IntervalSet(conflicts).complement(
+            self.start_time, self.end_time)
 
     def get_first_availability(self, start):
         return self.dbapi.offer_get_first_availability(self.uuid, start)
 
+    @staticmethod
+    def _validate_create(updates):
+        if updates['start_time'] >= updates['end_time']:
+            raise exception.InvalidTimeRange(
+                resource='offer',
+                start_time=str(updates['start_time']),
+                end_time=str(updates['end_time'])
+            )
+
+        # rejects unknown resource types
+        ro_factory.ResourceObjectFactory.get_resource_object(
+            updates['resource_type'], updates['resource_uuid'])
+
     def create(self, context=None):
         updates = self.obj_get_changes()
 
@@ -96,23 +100,48 @@ class Offer(base.ESILEAPObject):
             external=True)
         def _create_offer():
 
-            if updates['start_time'] >= updates['end_time']:
-                raise exception.InvalidTimeRange(
-                    resource='offer',
-                    start_time=str(updates['start_time']),
-                    end_time=str(updates['end_time'])
-                )
+            self._validate_create(updates)
 
-            ro = ro_factory.ResourceObjectFactory.get_resource_object(
-                updates['resource_type'], updates['resource_uuid'])
-            ro.verify_availability(updates['start_time'],
-                                   updates['end_time'])
-
-            db_offer = self.dbapi.offer_create(updates)
+            db_offer = self.dbapi.offer_create(updates,
+                                               verify_availability=True)
             self._from_db_object(context, self, db_offer)
 
         _create_offer()
 
+    @classmethod
+    def create_many(cls, offers, context=None):
+        """Create several offers in one checked transaction."""
+        all_updates = [o.obj_get_changes() for o in offers]
+
+        windows = collections.defaultdict(list)
+        for updates in all_updates:
+            cls._validate_create(updates)
+            windows[(updates['resource_type'],
+                     updates['resource_uuid'])].append(
+                (updates['start_time'], updates['end_time']))
+
+        # the new offers must not overlap each other either
+        for (r_type, r_uuid), times in windows.items():
+            times.sort()
+            if any(later[0] < earlier[1]
+                   for earlier, later in zip(times, times[1:])):
+                raise exception.ResourceTimeConflict(
+                    resource_uuid=r_uuid, resource_type=r_type)
+
+        # take the per-resource locks in a fixed order so concurrent
+        # batches cannot deadlock against each other
+        lock_names = sorted(utils.get_resource_lock_name(*resource)
+                            for resource in windows)
+        with contextlib.ExitStack() as stack:
+            for name in lock_names:
+                stack.enter_context(utils.lock(name, external=True))
+
+            db_offers = cls.dbapi.offer_create_many(
+                all_updates, verify_availability=True)
+
+        for o, db_offer in zip(offers, db_offers):
+            cls._from_db_object(context, o, db_offer)
+
     def cancel(self):
         leases = lease_obj.Lease.get_all(
             {'offer_uuid': self.uuid,
@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
+import cachetools
 from keystoneauth1 import loading as ks_loading
 
 from ironicclient import client as ironic_client
@@ -20,6 +23,14 @@ from esi_leap.resource_objects import base
 
 CONF = esi_leap.conf.CONF
 _cached_ironic_client = None
+_client_lock = threading.Lock()
+
+# a single request reads the same node several times; keep nodes briefly
+# so that those reads share one ironic round trip. The cache is only
+# invalidated in this process, so reads that decide a write must pass
+# fresh=True to _get_node
+_node_cache = cachetools.TTLCache(maxsize=2048, ttl=30)
+_node_cache_lock = threading.RLock()
 
 
 def get_ironic_client():
@@ -27,18 +38,45 @@ def get_ironic_client():
     if _cached_ironic_client is not None:
         return _cached_ironic_client
 
-    auth_plugin = ks_loading.load_auth_from_conf_options(CONF, 'ironic')
-    sess = ks_loading.load_session_from_conf_options(CONF, 'ironic',
-                                                     auth=auth_plugin)
+    with _client_lock:
+        # another thread may have built the client while we waited
+        if _cached_ironic_client is not None:
+            return _cached_ironic_client
 
-    kwargs = {'os_ironic_api_version': '1.65'}
-    cli = ironic_client.get_client(1,
-                                   session=sess, **kwargs)
-    _cached_ironic_client = cli
+        auth_plugin = ks_loading.load_auth_from_conf_options(CONF, 'ironic')
+        sess = ks_loading.load_session_from_conf_options(CONF, 'ironic',
+                                                         auth=auth_plugin)
+
+        kwargs = {'os_ironic_api_version': '1.65'}
+        cli = ironic_client.get_client(1,
+                                       session=sess, **kwargs)
+        _cached_ironic_client = cli
 
     return cli
 
 
+def _get_node(node_ident, fresh=False):
+    node = None
+    if not fresh:
+        with _node_cache_lock:
+            node = _node_cache.get(node_ident)
+    if node is None:
+        node = get_ironic_client().node.get(node_ident)
+        with _node_cache_lock:
+            _node_cache[node.uuid] = node
+    return node
+
+
+def _invalidate_node(node_uuid):
+    with _node_cache_lock:
+        _node_cache.pop(node_uuid, None)
+
+
+def _update_node(node_uuid, patches):
+    get_ironic_client().node.update(node_uuid, patches)
+    _invalidate_node(node_uuid)
+
+
 class IronicNode(base.ResourceObjectInterface):
 
     resource_type = 'ironic_node'
@@ -48,23 +86,25 @@ class IronicNode(base.ResourceObjectInterface):
 
     @classmethod
     def get_by_name(cls, name):
-        node = get_ironic_client().node.get(name)
+        node = _get_node(name)
         return IronicNode(node.uuid)
 
     def get_resource_uuid(self):
         return self._uuid
 
     def get_lease_uuid(self):
-        node = get_ironic_client().node.get(self._uuid)
+        # decides whether a lease is expired on the node, and the manager
+        # sets it from another process, so never answer from the cache
+        node = _get_node(self._uuid, fresh=True)
         return node.properties.get('lease_uuid', None)
 
     def get_project_id(self):
-        node = get_ironic_client().node.get(self._uuid)
+        node = _get_node(self._uuid)
         return node.lessee
 
     def get_node_config(self):
-        node = get_ironic_client().node.get(self._uuid)
-        config = node.properties
+        node = _get_node(self._uuid)
+        config = dict(node.properties)
         config.pop('lease_uuid', None)
         return config
 
@@ -80,27 +120,28 @@ class IronicNode(base.ResourceObjectInterface):
             "path": "/lessee",
             "value": lease.project_id,
         })
-        get_ironic_client().node.update(self._uuid, patches)
+        _update_node(self._uuid, patches)
 
     def expire_lease(self, lease):
-        patches = []
-        if self.get_lease_uuid() != lease.uuid:
+        # the node may have changed in ironic since it was cached, so
+        # read it fresh before deciding what to undo
+        node = _get_node(self._uuid, fresh=True)
+        if node.properties.get('lease_uuid', None) != lease.uuid:
             return
-        if self.get_lease_uuid():
-            patches.append({
-                "op": "remove",
-                "path": "/properties/lease_uuid",
-            })
-        if self.get_project_id():
+        patches = [{
+            "op": "remove",
+            "path": "/properties/lease_uuid",
+        }]
+        if node.lessee:
             patches.append({
                 "op": "remove",
                 "path": "/lessee",
             })
-        if len(patches) > 0:
-            get_ironic_client().node.update(self._uuid, patches)
-        state = get_ironic_client().node.get(self._uuid).provision_state
+        _update_node(self._uuid, patches)
+        state = _get_node(self._uuid, fresh=True).provision_state
         if state == "active":
             get_ironic_client().node.set_provision_state(self._uuid, "deleted")
+            _invalidate_node(self._uuid)
 
     def set_owner(self, owner_id):
         patches = [{
@@ -108,8 +149,8 @@ class IronicNode(base.ResourceObjectInterface):
             "path": "/owner",
             "value": owner_id,
         }]
-        get_ironic_client().node.update(self._uuid, patches)
+        _update_node(self._uuid, patches)
 
     def resource_admin_project_id(self):
-        node = get_ironic_client().node.get(self._uuid)
+        node = _get_node(self._uuid)
         return node.owner
@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
+import cachetools
 from oslo_utils import uuidutils
 
 from esi_leap.common import exception
@@ -19,6 +22,25 @@ from esi_leap.resource_objects import test_node
 
 RESOURCE_TYPES = ['ironic_node', 'dummy_node', 'test_node']
 
+# resolving an ironic node name costs an ironic round trip; a name keeps
+# resolving to the same uuid unless the node is renamed, so remember it
+_node_uuid_cache = cachetools.TTLCache(maxsize=1024, ttl=60)
+_node_uuid_cache_lock = threading.Lock()
+
+# resource objects only wrap an identifier and keep no state of their
+# own, so every caller can share one instance per resource
+_resource_object_cache = cachetools.LRUCache(maxsize=4096)
+_resource_object_cache_lock = threading.Lock()
+
+
+def _get_resource_object(ro_class, resource_uuid):
+    key = (ro_class, resource_uuid)
+    with _resource_object_cache_lock:
+        ro = _resource_object_cache.get(key)
+        if ro is None:
+            ro = _resource_object_cache[key] = ro_class(resource_uuid)
+    return ro
+
 
 class ResourceObjectFactory(object):
 
@@ -26,11 +48,22 @@ class ResourceObjectFactory(object):
     def get_resource_object(resource_type, resource_ident):
         if resource_type == 'ironic_node':
             if uuidutils.is_uuid_like(resource_ident):
-                return ironic_node.IronicNode(resource_ident)
-            else:
-                return ironic_node.IronicNode.get_by_name(resource_ident)
+                return _get_resource_object(ironic_node.IronicNode,
+                                            resource_ident)
+
+            with _node_uuid_cache_lock:
+                node_uuid = _node_uuid_cache.get(resource_ident)
+            if node_uuid is not None:
+                return _get_resource_object(ironic_node.IronicNode,
+                                            node_uuid)
+
+            node_uuid = ironic_node.IronicNode.get_by_name(
+                resource_ident).get_resource_uuid()
+            with _node_uuid_cache_lock:
+                _node_uuid_cache[resource_ident] = node_uuid
+            return _get_resource_object(ironic_node.IronicNode, node_uuid)
         elif resource_type == 'dummy_node':
-            return dummy_node.DummyNode(resource_ident)
+            return _get_resource_object(dummy_node.DummyNode, resource_ident)
         elif resource_type == 'test_node':
-            return test_node.TestNode(resource_ident)
+            return _get_resource_object(test_node.TestNode, resource_ident)
         raise exception.ResourceTypeUnknown(resource_type=resource_type)
@@ -10,10 +10,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import mock
 import pecan
 import pecan.testing
+import shutil
 import tempfile
+from unittest import mock
 
 from esi_leap.api import app
 import esi_leap.conf
@@ -26,6 +27,16 @@ PATH_PREFIX = '/v1'
 
 class APITestCase(base.DBTestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super(APITestCase, cls).setUpClass()
+        cls._lock_path = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._lock_path, ignore_errors=True)
+        super(APITestCase, cls).tearDownClass()
+
     def setUp(self):
         super(APITestCase, self).setUp()
 
@@ -42,7 +53,7 @@ class APITestCase(base.DBTestCase):
 
         self.mock_context.return_value = self.context
 
-        self.config(lock_path=tempfile.mkdtemp(), group='oslo_concurrency')
+        self.config(lock_path=self._lock_path, group='oslo_concurrency')
 
     # borrowed from Ironic
     def get_json(self, path, expect_errors=False, headers=None,
@@ -11,8 +11,8 @@
 #    under the License.
 
 from esi_leap.api.controllers import types as types
-import mock as mock
 import unittest as unittest
+from unittest import mock
 from wsme import types as wtypes
 
 
@@ -12,11 +12,11 @@
 
 import datetime
 import http.client as http_client
-import mock
 from oslo_context import context as ctx
 from oslo_policy import policy
 from oslo_utils import uuidutils
 import testtools
+from unittest import mock
 
 from esi_leap.api.controllers.v1.lease import LeasesController
 from esi_leap.common import exception
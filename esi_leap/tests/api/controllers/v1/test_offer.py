@@ -12,10 +12,10 @@
 
 import datetime
 import http.client as http_client
-import mock
 from oslo_policy import policy as oslo_policy
 from oslo_utils import uuidutils
 import testtools
+from unittest import mock
 
 from esi_leap.api.controllers.v1.offer import OffersController
 from esi_leap.common import policy
@@ -97,6 +97,41 @@ class TestOffersController(test_api_base.APITestCase):
         data = self.get_json('/offers')
         self.assertEqual(self.test_offer.uuid, data['offers'][0]["uuid"])
 
+    def test_get_available_filter(self):
+        self.test_offer.create(self.context)
+        free_offer = offer.Offer(
+            resource_type='test_node',
+            resource_uuid=uuidutils.generate_uuid(),
+            name="free_offer",
+            uuid=uuidutils.generate_uuid(),
+            status=statuses.AVAILABLE,
+            start_time=self.test_offer.start_time,
+            end_time=self.test_offer.end_time,
+            project_id=self.context.project_id,
+        )
+        free_offer.create(self.context)
+        self.db_api.lease_create({
+            'uuid': uuidutils.generate_uuid(),
+            'name': 'test_lease',
+            'project_id': self.context.project_id,
+            'owner_id': self.context.project_id,
+            'resource_type': self.test_offer.resource_type,
+            'resource_uuid': self.test_offer.resource_uuid,
+            'offer_uuid': self.test_offer.uuid,
+            'start_time': datetime.datetime(2016, 8, 5),
+            'end_time': datetime.datetime(2016, 8, 15),
+            'status': statuses.CREATED,
+        })
+
+        data = self.get_json('/offers',
+                             available_start_time='2016-08-10T00:00:00',
+                             available_end_time='2016-08-20T00:00:00')
+
+        self.assertEqual([free_offer.uuid],
+                         [o['uuid'] for o in data['offers']])
+        self.assertEqual([['2016-07-16T00:00:00', '2016-10-24T00:00:00']],
+                         data['offers'][0]['availabilities'])
+
     @mock.patch('esi_leap.api.controllers.v1.utils.ro_factory.'
                 'ResourceObjectFactory.get_resource_object')
     @mock.patch('oslo_utils.uuidutils.generate_uuid')
@@ -227,10 +262,11 @@ class TestOffersController(test_api_base.APITestCase):
         self.assertEqual(http_client.CREATED, request.status_int)
 
     @mock.patch('esi_leap.objects.offer.Offer.get_availabilities')
-    @mock.patch('esi_leap.objects.offer.Offer.get_all')
+    @mock.patch('esi_leap.objects.offer.Offer.get_all_with_conflict_times')
     def test_get_nofilters(self, mock_get_all, mock_get_availabilities):
 
-        mock_get_all.return_value = [self.test_offer, self.test_offer_2]
+        mock_get_all.return_value = [(self.test_offer, []),
+                                     (self.test_offer_2, [])]
         mock_get_availabilities.return_value = []
 
         expected_filters = {'status': 'available'}
@@ -240,14 +276,16 @@ class TestOffersController(test_api_base.APITestCase):
         request = self.get_json('/offers')
 
         mock_get_all.assert_called_once_with(expected_filters, self.context)
-        assert mock_get_availabilities.call_count == 2
+        mock_get_availabilities.assert_has_calls([mock.call([]),
+                                                  mock.call([])])
         self.assertEqual(request, expected_resp)
 
     @mock.patch('esi_leap.objects.offer.Offer.get_availabilities')
-    @mock.patch('esi_leap.objects.offer.Offer.get_all')
+    @mock.patch('esi_leap.objects.offer.Offer.get_all_with_conflict_times')
     def test_get_any_status(self, mock_get_all, mock_get_availabilities):
 
-        mock_get_all.return_value = [self.test_offer, self.test_offer_2]
+        mock_get_all.return_value = [(self.test_offer, []),
+                                     (self.test_offer_2, [])]
         mock_get_availabilities.return_value = []
 
         expected_filters = {}
@@ -262,11 +300,12 @@ class TestOffersController(test_api_base.APITestCase):
 
     @mock.patch('esi_leap.common.keystone.get_project_uuid_from_ident')
     @mock.patch('esi_leap.objects.offer.Offer.get_availabilities')
-    @mock.patch('esi_leap.objects.offer.Offer.get_all')
+    @mock.patch('esi_leap.objects.offer.Offer.get_all_with_conflict_times')
     def test_get_project_filter(self, mock_get_all, mock_get_availabilities,
                                 mock_gpufi):
 
-        mock_get_all.return_value = [self.test_offer, self.test_offer_2]
+        mock_get_all.return_value = [(self.test_offer, []),
+                                     (self.test_offer_2, [])]
         mock_get_availabilities.return_value = []
         mock_gpufi.return_value = self.context.project_id
 
@@ -286,11 +325,12 @@ class TestOffersController(test_api_base.APITestCase):
     @mock.patch('esi_leap.api.controllers.v1.utils.ro_factory.'
                 'ResourceObjectFactory.get_resource_object')
     @mock.patch('esi_leap.objects.offer.Offer.get_availabilities')
-    @mock.patch('esi_leap.objects.offer.Offer.get_all')
+    @mock.patch('esi_leap.objects.offer.Offer.get_all_with_conflict_times')
     def test_get_resource_filter(self, mock_get_all, mock_get_availabilities,
                                  mock_gro):
 
-        mock_get_all.return_value = [self.test_offer, self.test_offer_2]
+        mock_get_all.return_value = [(self.test_offer, []),
+                                     (self.test_offer_2, [])]
         mock_get_availabilities.return_value = []
         mock_gro.return_value = TestNode('54321')
 
@@ -311,12 +351,13 @@ class TestOffersController(test_api_base.APITestCase):
     @mock.patch('esi_leap.api.controllers.v1.utils.ro_factory.'
                 'ResourceObjectFactory.get_resource_object')
     @mock.patch('esi_leap.objects.offer.Offer.get_availabilities')
-    @mock.patch('esi_leap.objects.offer.Offer.get_all')
+    @mock.patch('esi_leap.objects.offer.Offer.get_all_with_conflict_times')
     def test_get_resource_filter_default_resource_type(self, mock_get_all,
                                                        mock_get_availabilities,
                                                        mock_gro):
 
-        mock_get_all.return_value = [self.test_offer, self.test_offer_2]
+        mock_get_all.return_value = [(self.test_offer, []),
+                                     (self.test_offer_2, [])]
         mock_get_availabilities.return_value = []
         mock_gro.return_value = IronicNode('54321')
 
@@ -335,11 +376,12 @@ class TestOffersController(test_api_base.APITestCase):
         self.assertEqual(request, expected_resp)
 
     @mock.patch('esi_leap.objects.offer.Offer.get_availabilities')
-    @mock.patch('esi_leap.objects.offer.Offer.get_all')
+    @mock.patch('esi_leap.objects.offer.Offer.get_all_with_conflict_times')
     @mock.patch.object(policy, 'authorize', spec=True)
     def test_get_lessee_filter(self, mock_authorize, mock_get_all,
                                mock_get_availabilities):
-        mock_get_all.return_value = [self.test_offer, self.test_offer_2]
+        mock_get_all.return_value = [(self.test_offer, []),
+                                     (self.test_offer_2, [])]
         mock_get_availabilities.return_value = []
         mock_authorize.side_effect = [
             None,
@@ -12,9 +12,9 @@
 
 import datetime
 import http.client as http_client
-import mock
 from oslo_policy import policy as oslo_policy
 from oslo_utils import uuidutils
+from unittest import mock
 
 from esi_leap.common import statuses
 from esi_leap.objects import owner_change
@@ -11,10 +11,10 @@
 #    under the License.
 
 import datetime
-import mock
 from oslo_context import context as ctx
 from oslo_policy import policy as oslo_policy
 from oslo_utils import uuidutils
+from unittest import mock
 
 import testtools
 
@@ -141,6 +141,25 @@ test_lease_4 = lease.Lease(
 )
 
 
+class TestProjectUUIDUtils(testtools.TestCase):
+
+    @mock.patch('esi_leap.common.keystone.get_project_uuid_from_ident')
+    def test_get_project_uuid_from_ident(self, mock_gpufi):
+        mock_gpufi.return_value = 'project_uuid'
+        context = ctx.RequestContext(project_id='ownerid')
+
+        for i in range(2):
+            self.assertEqual('project_uuid',
+                             utils.get_project_uuid_from_ident(
+                                 context, 'project_name'))
+
+        mock_gpufi.assert_called_once_with('project_name')
+
+        other_context = ctx.RequestContext(project_id='ownerid')
+        utils.get_project_uuid_from_ident(other_context, 'project_name')
+        self.assertEqual(2, mock_gpufi.call_count)
+
+
 class TestLeaseAuthorizeManagementUtils(testtools.TestCase):
 
     @mock.patch('esi_leap.objects.offer.Offer.get')
@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import sqlite3
+
 import fixtures
 
 from oslo_concurrency import lockutils
@@ -17,6 +20,7 @@ from oslo_config import fixture as config
 from oslo_context import context as ctx
 from oslo_db.sqlalchemy import enginefacade
 from oslotest import base
+import sqlalchemy as sa
 
 import esi_leap.conf
 from esi_leap.db import api as db_api
@@ -27,6 +31,16 @@ _DB_CACHE = None
 CONF = esi_leap.conf.CONF
 
 
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    # test databases are throwaway, so skip the durability work
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cursor = dbapi_conn.cursor()
+        cursor.execute('PRAGMA synchronous=OFF')
+        cursor.execute('PRAGMA journal_mode=MEMORY')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
+
+
 class Database(fixtures.Fixture):
 
     def __init__(self, engine, sql_connection, sqlite_clean_db):
@@ -35,20 +49,25 @@ class Database(fixtures.Fixture):
 
         self.engine = engine
         self.engine.dispose()
+        sa.event.listen(self.engine, 'connect', _set_sqlite_pragmas)
 
         models.Base.metadata.create_all(self.engine)
 
-        conn = self.engine.connect()
-        self._DB = "".join(line for line in conn.connection.iterdump())
+        # keep a page-level copy of the empty schema; restoring it with
+        # the backup API is much cheaper than replaying the DDL
+        self._DB = sqlite3.connect(':memory:', check_same_thread=False)
+        with self.engine.connect() as conn:
+            conn.connection.connection.backup(self._DB)
         self.engine.dispose()
 
     def setUp(self):
         super(Database, self).setUp()
 
+        # the engine keeps its single in-memory connection for the whole
+        # run; overwriting its pages resets it without reconnecting
         if self.sql_connection == "sqlite://":
-            conn = self.engine.connect()
-            conn.connection.executescript(self._DB)
-            self.addCleanup(self.engine.dispose)
+            with self.engine.connect() as conn:
+                self._DB.backup(conn.connection.connection)
 
 
 class TestCase(base.BaseTestCase):
@@ -81,3 +100,68 @@ class DBTestCase(TestCase):
                                  sql_connection=CONF.database.connection,
                                  sqlite_clean_db='clean.sqlite')
         self.useFixture(_DB_CACHE)
+
+    def seed_offers(self, *values):
+        """Insert offers in one statement and return them in order.
+
+        This skips db_api.offer_create, so use it only where a test needs
+        the rows present rather than the create path exercised.
+        """
+        session = enginefacade.get_legacy_facade().get_session()
+        try:
+            with session.begin():
+                session.bulk_insert_mappings(
+                    models.Offer, [dict(v) for v in values])
+            return session.query(models.Offer).\
+                filter(models.Offer.uuid.in_([v['uuid'] for v in values])).\
+                order_by(models.Offer.id).all()
+        finally:
+            session.close()
+
+    @contextlib.contextmanager
+    def assertQueryCountAtMost(self, count):
+        """Fail if the block runs more than count SQL statements."""
+        engine = enginefacade.get_legacy_facade().get_engine()
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            # oslo.db pings every connection it checks out and issues an
+            # explicit BEGIN on sqlite; neither is work done on behalf of
+            # the code under test.
+            if statement not in ('SELECT 1', 'BEGIN'):
+                statements.append(statement)
+
+        sa.event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            yield
+        finally:
+            sa.event.remove(engine, 'before_cursor_execute', _record)
+        self.assertLessEqual(len(statements), count, statements)
+
+
+class SeededDBTestCase(DBTestCase):
+    """Database test case sharing rows inserted once per class.
+
+    The first test of each class runs seed() against the empty schema
+    and snapshots the result; every later test restores that snapshot
+    instead of inserting the rows again.
+    """
+
+    def seed(self):
+        """Insert the rows shared by every test in the class."""
+
+    def setUp(self):
+        super(SeededDBTestCase, self).setUp()
+
+        cls = type(self)
+        engine = enginefacade.get_legacy_facade().get_engine()
+        snapshot = cls.__dict__.get('_seed_snapshot')
+        if snapshot is None:
+            self.seed()
+            snapshot = sqlite3.connect(':memory:', check_same_thread=False)
+            with engine.connect() as conn:
+                conn.connection.connection.backup(snapshot)
+            cls._seed_snapshot = snapshot
+        else:
+            with engine.connect() as conn:
+                snapshot.backup(conn.connection.connection)
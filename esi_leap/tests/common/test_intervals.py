@@ -0,0 +1,42 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from esi_leap.common import intervals
+from esi_leap.tests import base
+
+
+class IntervalSetTestCase(base.TestCase):
+
+    def test_merge(self):
+        s = intervals.IntervalSet([(50, 60), (10, 20), (15, 30), (30, 40),
+                                   (70, 75), (71, 72)])
+        self.assertEqual([(10, 40), (50, 60), (70, 75)], list(s))
+        self.assertEqual(3, len(s))
+
+    def test_complement(self):
+        s = intervals.IntervalSet([(50, 60), (10, 20), (20, 30)])
+        self.assertEqual([[0, 10], [30, 50], [60, 100]],
+                         s.complement(0, 100))
+
+    def test_complement_clipped(self):
+        s = intervals.IntervalSet([(-10, 5), (20, 30), (90, 110)])
+        self.assertEqual([[5, 20], [30, 90]], s.complement(0, 100))
+        self.assertEqual([[30, 40]], s.complement(25, 40))
+
+    def test_complement_covered(self):
+        s = intervals.IntervalSet([(0, 50), (50, 100)])
+        self.assertEqual([], s.complement(0, 100))
+        self.assertEqual([], s.complement(10, 20))
+
+    def test_complement_empty(self):
+        self.assertEqual([[0, 100]],
+                         intervals.IntervalSet().complement(0, 100))
@@ -10,7 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import mock
+from keystoneauth1 import exceptions as ks_exception
+from unittest import mock
 
 from esi_leap.common import exception as e
 from esi_leap.common import keystone
@@ -18,13 +19,56 @@ from esi_leap.tests import base
 
 
 class FakeProject(object):
-    def __init__(self):
-        self.id = "uuid"
+    def __init__(self, id="uuid", parent_id=None):
+        self.id = id
         self.name = "name"
+        self.parent_id = parent_id
 
 
 class KeystoneTestCase(base.TestCase):
 
+    def setUp(self):
+        super(KeystoneTestCase, self).setUp()
+        keystone._project_tree_cache.clear()
+        self.addCleanup(keystone._project_tree_cache.clear)
+
+    @mock.patch.object(keystone, 'get_keystone_client', autospec=True)
+    def test_get_parent_project_id_tree(self, mock_keystone):
+        mock_keystone.return_value.projects.get.side_effect = [
+            FakeProject('child', parent_id='parent'),
+            FakeProject('parent'),
+        ]
+
+        project_ids = keystone.get_parent_project_id_tree('child')
+
+        self.assertEqual(['child', 'parent'], project_ids)
+        mock_keystone.return_value.projects.get.assert_has_calls(
+            [mock.call('child'), mock.call('parent')])
+
+    @mock.patch.object(keystone, 'get_keystone_client', autospec=True)
+    def test_get_parent_project_id_tree_cached(self, mock_keystone):
+        mock_keystone.return_value.projects.get.side_effect = [
+            FakeProject('child', parent_id='parent'),
+            FakeProject('parent'),
+        ]
+
+        keystone.get_parent_project_id_tree('child')
+        project_ids = keystone.get_parent_project_id_tree('child')
+
+        self.assertEqual(['child', 'parent'], project_ids)
+        self.assertEqual(2, mock_keystone.return_value.projects.get.call_count)
+
+    @mock.patch.object(keystone, 'get_keystone_client', autospec=True)
+    def test_get_parent_project_id_tree_unauthorized(self, mock_keystone):
+        keystone._project_tree_cache['other'] = ('other',)
+        mock_keystone.return_value.projects.get.side_effect = \
+            ks_exception.Unauthorized()
+
+        self.assertRaises(ks_exception.Unauthorized,
+                          keystone.get_parent_project_id_tree,
+                          'child')
+        self.assertEqual(0, len(keystone._project_tree_cache))
+
     @mock.patch('oslo_utils.uuidutils.is_uuid_like')
     def test_get_project_uuid_from_ident_uuid(self, mock_iul):
         mock_iul.return_value = True
@@ -11,14 +11,25 @@
 #    under the License.
 
 import datetime
-import mock
+import types
+from unittest import mock
 
 from esi_leap.common import exception as e
 from esi_leap.common import statuses
 from esi_leap.db.sqlalchemy import api
+from esi_leap.db.sqlalchemy import models
 import esi_leap.tests.base as base
 
 now = datetime.datetime(2016, 7, 16, 19, 20, 30)
+# now shifted by a whole number of days, keyed by the offset
+day = {k: now + datetime.timedelta(days=k) for k in range(-10, 151)}
+
+
+def _fresh(d, **over):
+    r = dict(d)
+    r.update(over)
+    return r
+
 
 test_offer_1 = dict(
     uuid='11111',
@@ -27,7 +38,7 @@ test_offer_1 = dict(
     resource_uuid='1111',
     resource_type='dummy_node',
     start_time=now,
-    end_time=now + datetime.timedelta(days=100),
+    end_time=day[100],
     properties={'foo': 'bar'},
     status=statuses.AVAILABLE,
 )
@@ -39,9 +50,9 @@ test_offer_2 = dict(
     name='o1',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=25),
-    end_time=now + datetime.timedelta(days=100),
-    properties={'foo': 'bar'},
+    start_time=day[25],
+    end_time=day[100],
+    properties={},
     status=statuses.AVAILABLE,
 )
 
@@ -52,9 +63,9 @@ test_offer_3 = dict(
     name='o1',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=50),
-    end_time=now + datetime.timedelta(days=100),
-    properties={'foo': 'bar'},
+    start_time=day[50],
+    end_time=day[100],
+    properties={},
     status=statuses.AVAILABLE,
 )
 
@@ -65,9 +76,9 @@ test_offer_4 = dict(
     name='o2',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=75),
-    end_time=now + datetime.timedelta(days=100),
-    properties={'foo': 'bar'},
+    start_time=day[75],
+    end_time=day[100],
+    properties={},
     status=statuses.AVAILABLE,
 )
 
@@ -78,9 +89,9 @@ test_offer_5 = dict(
     name='o2',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=105),
-    end_time=now + datetime.timedelta(days=150),
-    properties={'foo': 'bar'},
+    start_time=day[105],
+    end_time=day[150],
+    properties={},
     status=statuses.AVAILABLE,
 )
 
@@ -91,8 +102,8 @@ test_lease_1 = dict(
     name='l1',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=10),
-    end_time=now + datetime.timedelta(days=20),
+    start_time=day[10],
+    end_time=day[20],
     properties={},
     status=statuses.CREATED,
 )
@@ -104,8 +115,8 @@ test_lease_2 = dict(
     name='l1',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=20),
-    end_time=now + datetime.timedelta(days=30),
+    start_time=day[20],
+    end_time=day[30],
     properties={},
     status=statuses.CREATED,
 )
@@ -117,8 +128,8 @@ test_lease_3 = dict(
     name='l1',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=50),
-    end_time=now + datetime.timedelta(days=60),
+    start_time=day[50],
+    end_time=day[60],
     properties={},
     status=statuses.ACTIVE,
 )
@@ -130,8 +141,8 @@ test_lease_4 = dict(
     name='l4',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=85),
-    end_time=now + datetime.timedelta(days=90),
+    start_time=day[85],
+    end_time=day[90],
     properties={},
     status=statuses.CANCELLED,
 )
@@ -142,13 +153,21 @@ test_lease_5 = dict(
     name='l5',
     resource_uuid='1111',
     resource_type='dummy_node',
-    start_time=now + datetime.timedelta(days=90),
-    end_time=now + datetime.timedelta(days=100),
+    start_time=day[90],
+    end_time=day[100],
     uuid='55555',
     properties={},
     status=statuses.EXPIRED,
 )
 
+# shared fixtures are read-only; use _fresh() for per-test variants
+test_offer_1, test_offer_2, test_offer_3, test_offer_4, test_offer_5 = (
+    types.MappingProxyType(o) for o in
+    (test_offer_1, test_offer_2, test_offer_3, test_offer_4, test_offer_5))
+test_lease_1, test_lease_2, test_lease_3, test_lease_4, test_lease_5 = (
+    types.MappingProxyType(lease) for lease in
+    (test_lease_1, test_lease_2, test_lease_3, test_lease_4, test_lease_5))
+
 
 class TestOfferAPI(base.DBTestCase):
 
@@ -158,175 +177,98 @@ class TestOfferAPI(base.DBTestCase):
         assert len(o) == 1
         assert o[0].to_dict() == offer.to_dict()
 
-    def test_offer_verify_availability(self):
-        offer = api.offer_create(test_offer_1)
+    def test_offer_create_verify_availability(self):
+        api.offer_create(test_offer_1, verify_availability=True)
+        api.offer_create(test_offer_5, verify_availability=True)
+        self.assertRaises(e.ResourceTimeConflict, api.offer_create,
+                          test_offer_2, verify_availability=True)
+        self.assertEqual([test_offer_1['uuid'], test_offer_5['uuid']],
+                         [o.uuid for o in api.offer_get_all({})])
 
-        test_lease_1['offer_uuid'] = offer.uuid
-        test_lease_2['offer_uuid'] = offer.uuid
-        test_lease_3['offer_uuid'] = offer.uuid
+    def test_offer_constraint(self):
+        o1 = api.offer_create(test_offer_1)
+        o2 = api.offer_create(test_offer_2)
+        api.offer_create(test_offer_3)
 
-        api.lease_create(test_lease_1)
-        api.lease_create(test_lease_2)
-        api.lease_create(test_lease_3)
+        query = api.constraint(uuid=api.equal_any(o1.uuid, o2.uuid)).apply(
+            models.Offer, api.model_query(models.Offer))
+        self.assertEqual([o1.uuid, o2.uuid], [o.uuid for o in query])
 
-        start = now + datetime.timedelta(days=35)
-        end = now + datetime.timedelta(days=40)
-        api.offer_verify_availability(offer, start, end)
-
-        start = now + datetime.timedelta(days=5)
-        end = now + datetime.timedelta(days=10)
-        api.offer_verify_availability(offer, start, end)
-
-        start = now
-        end = now + datetime.timedelta(days=10)
-        api.offer_verify_availability(offer, start, end)
-
-        start = now + datetime.timedelta(days=90)
-        end = now + datetime.timedelta(days=100)
-        api.offer_verify_availability(offer, start, end)
-
-        start = now + datetime.timedelta(days=60)
-        end = now + datetime.timedelta(days=100)
-        api.offer_verify_availability(offer, start, end)
-
-        start = now + datetime.timedelta(days=30)
-        end = now + datetime.timedelta(days=50)
-        api.offer_verify_availability(offer, start, end)
-
-        start = now + datetime.timedelta(days=15)
-        end = now + datetime.timedelta(days=16)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=45)
-        end = now + datetime.timedelta(days=55)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=55)
-        end = now + datetime.timedelta(days=65)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=50)
-        end = now + datetime.timedelta(days=65)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=45)
-        end = now + datetime.timedelta(days=60)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=90)
-        end = now + datetime.timedelta(days=105)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=100)
-        end = now + datetime.timedelta(days=105)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=105)
-        end = now + datetime.timedelta(days=110)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now - datetime.timedelta(days=1)
-        end = now + datetime.timedelta(days=5)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now - datetime.timedelta(days=1)
-        end = now
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now - datetime.timedelta(days=10)
-        end = now - datetime.timedelta(days=5)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        start = now + datetime.timedelta(days=45)
-        end = now + datetime.timedelta(days=55)
-        self.assertRaises(e.OfferNoTimeAvailabilities,
-                          api.offer_verify_availability,
-                          offer, start, end)
-
-        test_lease_4['offer_uuid'] = offer.uuid
-        api.lease_create(test_lease_4)
-        start = now + datetime.timedelta(days=86)
-        end = now + datetime.timedelta(days=87)
-        api.offer_verify_availability(offer, start, end)
+        query = api.constraint(uuid=api.not_equal(o1.uuid, o2.uuid)).apply(
+            models.Offer, api.model_query(models.Offer))
+        self.assertEqual([test_offer_3['uuid']], [o.uuid for o in query])
 
     def test_offer_get_conflict_times(self):
         o1 = api.offer_create(test_offer_1)
         self.assertEqual(api.offer_get_conflict_times(o1), [])
-        test_lease_3['offer_uuid'] = o1.uuid
-        api.lease_create(test_lease_3)
+        api.lease_create(_fresh(test_lease_3, offer_uuid=o1.uuid))
+        api.lease_create(_fresh(test_lease_1, offer_uuid=o1.uuid))
+        with self.assertQueryCountAtMost(1):
+            conflicts = api.offer_get_conflict_times(o1)
+        self.assertEqual(conflicts,
+                         [(day[10], day[20]), (day[50], day[60])])
+
+    def test_offer_get_conflict_times_single(self):
+        o1 = api.offer_create(test_offer_1)
+        api.lease_create(_fresh(test_lease_3, offer_uuid=o1.uuid))
         self.assertEqual(api.offer_get_conflict_times(o1),
-                         [(now + datetime.timedelta(days=50),
-                          now + datetime.timedelta(days=60))])
+                         [(day[50], day[60])])
 
-    def test_offer_get_first_availability(self):
+    def test_offer_get_all_with_conflict_times(self):
+        self.assertEqual(api.offer_get_all_with_conflict_times({}), [])
         o1 = api.offer_create(test_offer_1)
-        self.assertEqual(api.offer_get_first_availability
-                         (o1.uuid, o1.start_time,), None)
-        test_lease_3['offer_uuid'] = o1.uuid
-        api.lease_create(test_lease_3)
-        self.assertEqual(api.offer_get_first_availability
-                         (o1.uuid, o1.start_time), (now + datetime
-                                                    .timedelta(days=50),))
+        o2 = api.offer_create(test_offer_2)
+        api.lease_create(_fresh(test_lease_3, offer_uuid=o1.uuid))
+        api.lease_create(_fresh(test_lease_1, offer_uuid=o1.uuid))
+        api.lease_create(_fresh(test_lease_4, offer_uuid=o2.uuid))
 
-    def test_offer_get_by_uuid(self):
-        o1 = api.offer_create(test_offer_1)
-        res = api.offer_get_by_uuid(o1.uuid)
-        self.assertEqual(o1.uuid, res.uuid)
-        self.assertEqual(o1.project_id, res.project_id)
-        self.assertEqual(o1.properties, res.properties)
+        with self.assertQueryCountAtMost(1):
+            res = api.offer_get_all_with_conflict_times({})
 
-    def test_offer_get_by_uuid_not_found(self):
-        assert api.offer_get_by_uuid('some_uuid') is None
+        self.assertEqual([o1.uuid, o2.uuid],
+                         [offer_ref.uuid for offer_ref, conflicts in res])
+        self.assertEqual([[(day[10], day[20]), (day[50], day[60])], []],
+                         [conflicts for offer_ref, conflicts in res])
 
-    def test_offer_get_by_name(self):
+    def test_offer_get_all_with_conflict_times_availability_filter(self):
         o1 = api.offer_create(test_offer_1)
         o2 = api.offer_create(test_offer_2)
-        o3 = api.offer_create(test_offer_3)
-        api.offer_create(test_offer_4)
-
-        res = api.offer_get_by_name('o1')
-        assert len(res) == 3
-        self.assertEqual(o1.uuid, res[0].uuid)
-        self.assertEqual(o1.project_id, res[0].project_id)
+        api.lease_create(_fresh(test_lease_3, offer_uuid=o1.uuid))
+        api.lease_create(_fresh(test_lease_1, offer_uuid=o1.uuid))
+        api.lease_create(_fresh(test_lease_2, offer_uuid=o2.uuid))
 
-        self.assertEqual(o2.uuid, res[1].uuid)
-        self.assertEqual(o2.project_id, res[1].project_id)
+        with self.assertQueryCountAtMost(1):
+            res = api.offer_get_all_with_conflict_times({
+                'available_start_time': day[26],
+                'available_end_time': day[40],
+            })
 
-        self.assertEqual(o3.uuid, res[2].uuid)
-        self.assertEqual(o3.project_id, res[2].project_id)
+        self.assertEqual(
+            [(o1.uuid, [(day[10], day[20]), (day[50], day[60])])],
+            [(offer_ref.uuid, conflicts) for offer_ref, conflicts in res])
 
-    def test_offer_get_by_name_not_found(self):
-        self.assertEqual(api.offer_get_by_name('some_name'), [])
+    def test_offer_get_first_availability(self):
+        o1 = api.offer_create(test_offer_1)
+        self.assertEqual(api.offer_get_first_availability
+                         (o1.uuid, o1.start_time,), None)
+        api.lease_create(_fresh(test_lease_3, offer_uuid=o1.uuid))
+        with self.assertQueryCountAtMost(1):
+            first = api.offer_get_first_availability(o1.uuid, o1.start_time)
+        self.assertEqual((day[50],), first)
 
     def test_offer_destroy(self):
         o1 = api.offer_create(test_offer_2)
         api.offer_destroy(o1.uuid)
-        self.assertEqual(api.offer_get_by_uuid('offer_2'), None)
+        self.assertEqual(api.offer_get_by_uuid(o1.uuid), None)
 
-    def test_offer_destroy_not_found(self):
-        self.assertEqual(api.offer_get_by_uuid('offer_4'), None)
+    def test_offer_destroy_with_lease(self):
+        o1 = api.offer_create(test_offer_1)
+        l1 = api.lease_create(_fresh(test_lease_1, offer_uuid=o1.uuid))
+        api.offer_destroy(o1.uuid)
+        self.assertIsNone(api.offer_get_by_uuid(o1.uuid))
+        # sqlite does not enforce the foreign key; the lease must not be
+        # detached from its offer either way
+        self.assertEqual(o1.uuid, api.lease_get_by_uuid(l1.uuid).offer_uuid)
 
     def test_offer_update(self):
         o1 = api.offer_create(test_offer_3)
@@ -340,107 +282,190 @@ class TestOfferAPI(base.DBTestCase):
 
     def test_offer_update_invalid_time(self):
         o1 = api.offer_create(test_offer_3)
-        values = {'start_time': now + datetime.timedelta(days=101),
+        values = {'start_time': day[101],
                   'end_time': now}
         self.assertRaises(e.InvalidTimeRange, api.offer_update,
                           o1.uuid, values)
 
+    def test_offer_get_all_availability_filter(self):
+        o1 = api.offer_create(test_offer_1)
+        o2 = api.offer_create(test_offer_2)
+        o3 = api.offer_create(test_offer_3)
+        api.lease_create(_fresh(test_lease_2, offer_uuid=o1.uuid))
+        api.lease_create(_fresh(test_lease_4, offer_uuid=o2.uuid))
+
+        res = api.offer_get_all({
+            'available_start_time': day[26],
+            'available_end_time': day[40],
+        })
+
+        with self.assertQueryCountAtMost(1):
+            rows = res.all()
+        self.assertEqual(1, len(rows))
+        self.assertEqual([o2.to_dict()], [r.to_dict() for r in rows])
+
+        res = api.offer_get_all({
+            'available_start_time': day[80],
+            'available_end_time': day[95],
+        })
+
+        with self.assertQueryCountAtMost(1):
+            rows = res.all()
+        self.assertEqual(3, len(rows))
+        self.assertEqual([o1.to_dict(), o2.to_dict(), o3.to_dict()],
+                         [r.to_dict() for r in rows])
+
+    def test_offer_get_all_availability_filter_statement(self):
+        filters = {
+            'available_start_time': day[26],
+            'available_end_time': day[40],
+        }
+        before = str(api.offer_get_all(dict(filters)).statement)
+
+        o1 = api.offer_create(test_offer_1)
+        api.lease_create(_fresh(test_lease_2, offer_uuid=o1.uuid))
+
+        # conflicts are excluded in SQL, so the statement must not
+        # depend on how many offers conflict
+        self.assertEqual(before,
+                         str(api.offer_get_all(dict(filters)).statement))
+
+
+class TestOfferVerifyAvailabilityAPI(base.SeededDBTestCase):
+
+    # (start, end) in days from now, against leases on days 10-20,
+    # 20-30 and 50-60 of an offer running from day 0 to day 100
+    available = [
+        (35, 40), (5, 10), (0, 10), (90, 100), (60, 100), (30, 50),
+    ]
+    unavailable = [
+        (15, 16), (45, 55), (55, 65), (50, 65), (45, 60), (90, 105),
+        (100, 105), (105, 110), (-1, 5), (-1, 0), (-10, -5),
+    ]
+
+    def seed(self):
+        offer, = self.seed_offers(test_offer_1)
+        api.lease_create(_fresh(test_lease_1, offer_uuid=offer.uuid))
+        api.lease_create(_fresh(test_lease_2, offer_uuid=offer.uuid))
+        api.lease_create(_fresh(test_lease_3, offer_uuid=offer.uuid))
+        type(self).offer = offer
+
+    def test_offer_verify_availability(self):
+        for start, end in self.available:
+            with self.subTest(start=start, end=end), \
+                    self.assertQueryCountAtMost(1):
+                api.offer_verify_availability(
+                    self.offer,
+                    day[start],
+                    day[end])
+
+    def test_offer_verify_availability_conflict(self):
+        for start, end in self.unavailable:
+            with self.subTest(start=start, end=end), \
+                    self.assertQueryCountAtMost(1):
+                self.assertRaises(e.OfferNoTimeAvailabilities,
+                                  api.offer_verify_availability,
+                                  self.offer,
+                                  day[start],
+                                  day[end])
+
+    def test_offer_verify_availability_cancelled_lease(self):
+        api.lease_create(_fresh(test_lease_4, offer_uuid=self.offer.uuid))
+        start = day[86]
+        end = day[87]
+        with self.assertQueryCountAtMost(1):
+            api.offer_verify_availability(self.offer, start, end)
+
+
+class TestOfferAPISeeded(base.SeededDBTestCase):
+
+    def seed(self):
+        type(self).offers = self.seed_offers(
+            test_offer_1, test_offer_2, test_offer_3, test_offer_4,
+            test_offer_5)
+        type(self).offer_dicts = [o.to_dict() for o in self.offers]
+
+    def test_offer_get_by_uuid(self):
+        o1 = self.offers[0]
+        res = api.offer_get_by_uuid(o1.uuid)
+        self.assertEqual(o1.uuid, res.uuid)
+        self.assertEqual(o1.project_id, res.project_id)
+        self.assertEqual(o1.properties, res.properties)
+
+    def test_offer_get_by_name_not_found(self):
+        self.assertEqual(api.offer_get_by_name('some_name'), [])
+
     def test_offer_get_all(self):
-        o1 = api.offer_create(test_offer_2)
-        o2 = api.offer_create(test_offer_3)
         res = api.offer_get_all({})
 
-        self.assertEqual(2, res.count())
-        self.assertEqual((o1.to_dict(), o2.to_dict()),
-                         (res[0].to_dict(), res[1].to_dict()))
+        with self.assertQueryCountAtMost(1):
+            rows = res.all()
+        self.assertEqual(self.offer_dicts, [r.to_dict() for r in rows])
+
+    def test_offer_get_by_name(self):
+        o1, o2, o3 = self.offers[:3]
+
+        res = api.offer_get_by_name('o1')
+        self.assertEqual([(x.uuid, x.project_id) for x in (o1, o2, o3)],
+                         [(r.uuid, r.project_id) for r in res])
 
     @mock.patch('esi_leap.common.keystone.get_parent_project_id_tree')
     def test_offer_get_all_lessee_filter(self, mock_gppit):
         mock_gppit.return_value = ['12345', '67890']
 
-        o1 = api.offer_create(test_offer_1)
-        o2 = api.offer_create(test_offer_2)
-        o3 = api.offer_create(test_offer_3)
-        api.offer_create(test_offer_4)
-        o5 = api.offer_create(test_offer_5)
+        o1, o2, o3, _, o5 = self.offer_dicts
         res = api.offer_get_all({'lessee_id': '12345'})
 
         mock_gppit.assert_called_once_with('12345')
-        self.assertEqual(4, res.count())
-        self.assertEqual((o1.to_dict(), o2.to_dict(), o3.to_dict(),
-                          o5.to_dict()),
-                         (res[0].to_dict(), res[1].to_dict(),
-                          res[2].to_dict(), res[3].to_dict()))
+        with self.assertQueryCountAtMost(1):
+            rows = res.all()
+        self.assertEqual(4, len(rows))
+        self.assertEqual([o1, o2, o3, o5], [r.to_dict() for r in rows])
 
     def test_offer_get_all_time_filter(self):
-        o1 = api.offer_create(test_offer_1)
-        o2 = api.offer_create(test_offer_2)
-        api.offer_create(test_offer_3)
-        api.offer_create(test_offer_4)
-        api.offer_create(test_offer_5)
+        o1 = self.offers[0]
         res = api.offer_get_all({
             'start_time': o1.start_time + datetime.timedelta(days=26),
             'end_time': o1.end_time + datetime.timedelta(days=-1),
         })
 
-        self.assertEqual(2, res.count())
-        self.assertEqual((o1.to_dict(), o2.to_dict()),
-                         (res[0].to_dict(), res[1].to_dict()))
+        with self.assertQueryCountAtMost(1):
+            rows = res.all()
+        self.assertEqual(2, len(rows))
+        self.assertEqual(self.offer_dicts[:2], [r.to_dict() for r in rows])
 
     def test_offer_get_all_time_filter_within(self):
-        o1 = api.offer_create(test_offer_1)
-        o2 = api.offer_create(test_offer_2)
-        o3 = api.offer_create(test_offer_3)
-        o4 = api.offer_create(test_offer_4)
-        api.offer_create(test_offer_5)
+        o1, o2 = self.offers[:2]
         res = api.offer_get_all({
             'start_time': o1.end_time + datetime.timedelta(days=-2),
             'end_time': o2.end_time + datetime.timedelta(days=1),
             'time_filter_type': 'within'
         })
 
-        self.assertEqual(4, res.count())
-        self.assertEqual((o1.to_dict(), o2.to_dict(), o3.to_dict(),
-                          o4.to_dict()),
-                         (res[0].to_dict(), res[1].to_dict(),
-                          res[2].to_dict(), res[3].to_dict()))
+        with self.assertQueryCountAtMost(1):
+            rows = res.all()
+        self.assertEqual(4, len(rows))
+        self.assertEqual(self.offer_dicts[:4], [r.to_dict() for r in rows])
 
 
 class TestLeaseAPI(base.DBTestCase):
 
     def test_lease_get_by_uuid(self):
         o1 = api.offer_create(test_offer_2)
-        test_lease_4['offer_uuid'] = o1.uuid
-        l1 = api.lease_create(test_lease_4)
+        l1 = api.lease_create(_fresh(test_lease_4, offer_uuid=o1.uuid))
         res = api.lease_get_by_uuid(l1.uuid)
         self.assertEqual(l1.uuid, res.uuid)
 
-    def test_lease_get_by_uuid_not_found(self):
-        assert api.lease_get_by_uuid('some_uuid') is None
-
     def test_lease_get_by_name(self):
-        o1 = api.offer_create(test_offer_1)
-        o2 = api.offer_create(test_offer_2)
-        o3 = api.offer_create(test_offer_3)
-        o4 = api.offer_create(test_offer_4)
-        test_lease_1['offer_uuid'] = o1.uuid
-        test_lease_2['offer_uuid'] = o2.uuid
-        test_lease_3['offer_uuid'] = o3.uuid
-        test_lease_4['offer_uuid'] = o4.uuid
-        l1 = api.lease_create(test_lease_1)
-        l2 = api.lease_create(test_lease_2)
-        l3 = api.lease_create(test_lease_3)
-        api.lease_create(test_lease_4)
+        o1, o2, o3, o4 = self.seed_offers(
+            test_offer_1, test_offer_2, test_offer_3, test_offer_4)
+        l1 = api.lease_create(_fresh(test_lease_1, offer_uuid=o1.uuid))
+        l2 = api.lease_create(_fresh(test_lease_2, offer_uuid=o2.uuid))
+        l3 = api.lease_create(_fresh(test_lease_3, offer_uuid=o3.uuid))
+        api.lease_create(_fresh(test_lease_4, offer_uuid=o4.uuid))
         res = api.lease_get_by_name('l1')
-        assert len(res) == 3
-        self.assertEqual(l1.uuid, res[0].uuid)
-        self.assertEqual(l1.project_id, res[0].project_id)
-
-        self.assertEqual(l2.uuid, res[1].uuid)
-        self.assertEqual(l2.project_id, res[1].project_id)
-
-        self.assertEqual(l3.uuid, res[2].uuid)
-        self.assertEqual(l3.project_id, res[2].project_id)
+        self.assertEqual([(x.uuid, x.project_id) for x in (l1, l2, l3)],
+                         [(r.uuid, r.project_id) for r in res])
 
     def test_lease_get_by_name_not_found(self):
         self.assertEqual(api.lease_get_by_name('some_name'), [])
@@ -450,9 +475,10 @@ class TestLeaseAPI(base.DBTestCase):
         api.lease_create(test_lease_2)
 
         res = api.lease_get_all({})
-        res_uuids = [res_lease.to_dict()['uuid'] for res_lease in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_lease.uuid for res_lease in res]
 
-        self.assertEqual(2, res.count())
+        self.assertEqual(2, len(res_uuids))
         self.assertIn(test_lease_1['uuid'], res_uuids)
         self.assertIn(test_lease_2['uuid'], res_uuids)
 
@@ -465,9 +491,10 @@ class TestLeaseAPI(base.DBTestCase):
 
         res = api.lease_get_all({'status': [statuses.CREATED,
                                             statuses.ACTIVE]})
-        res_uuids = [res_lease.to_dict()['uuid'] for res_lease in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_lease.uuid for res_lease in res]
 
-        self.assertEqual(3, res.count())
+        self.assertEqual(3, len(res_uuids))
         self.assertIn(test_lease_1['uuid'], res_uuids)
         self.assertIn(test_lease_2['uuid'], res_uuids)
         self.assertIn(test_lease_3['uuid'], res_uuids)
@@ -482,9 +509,10 @@ class TestLeaseAPI(base.DBTestCase):
 
         res = api.lease_get_all({'start_time': start_time,
                                  'end_time': end_time})
-        res_uuids = [res_lease.to_dict()['uuid'] for res_lease in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_lease.uuid for res_lease in res]
 
-        self.assertEqual(1, res.count())
+        self.assertEqual(1, len(res_uuids))
         self.assertIn(test_lease_2['uuid'], res_uuids)
 
     def test_lease_get_all_filter_by_time_within(self):
@@ -498,9 +526,10 @@ class TestLeaseAPI(base.DBTestCase):
         res = api.lease_get_all({'start_time': start_time,
                                  'end_time': end_time,
                                  'time_filter_type': 'within'})
-        res_uuids = [res_lease.to_dict()['uuid'] for res_lease in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_lease.uuid for res_lease in res]
 
-        self.assertEqual(2, res.count())
+        self.assertEqual(2, len(res_uuids))
         self.assertIn(test_lease_1['uuid'], res_uuids)
         self.assertIn(test_lease_2['uuid'], res_uuids)
 
@@ -512,25 +541,24 @@ class TestLeaseAPI(base.DBTestCase):
         api.lease_create(test_lease_5)
 
         res = api.lease_get_all({'project_or_owner_id': '0wn3r'})
-        res_uuids = [res_lease.to_dict()['uuid'] for res_lease in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_lease.uuid for res_lease in res]
 
-        self.assertEqual(3, res.count())
+        self.assertEqual(3, len(res_uuids))
         self.assertIn(test_lease_1['uuid'], res_uuids)
         self.assertIn(test_lease_2['uuid'], res_uuids)
         self.assertIn(test_lease_5['uuid'], res_uuids)
 
     def test_lease_create(self):
         o1 = api.offer_create(test_offer_2)
-        test_lease_4['offer_uuid'] = o1.uuid
-        l1 = api.lease_create(test_lease_4)
+        l1 = api.lease_create(_fresh(test_lease_4, offer_uuid=o1.uuid))
         l2 = api.lease_get_all({}).all()
         assert len(l2) == 1
         assert l2[0].to_dict() == l1.to_dict()
 
     def test_lease_update(self):
         o1 = api.offer_create(test_offer_2)
-        test_lease_4['offer_uuid'] = o1.uuid
-        l1 = api.lease_create(test_lease_4)
+        l1 = api.lease_create(_fresh(test_lease_4, offer_uuid=o1.uuid))
         values = {'start_time': test_lease_5['start_time'],
                   'end_time': test_lease_5['end_time']}
         api.lease_update(l1.uuid, values)
@@ -540,78 +568,78 @@ class TestLeaseAPI(base.DBTestCase):
 
     def test_lease_update_invalid_time(self):
         o1 = api.offer_create(test_offer_3)
-        test_lease_4['offer_uuid'] = o1.uuid
-        l1 = api.lease_create(test_lease_4)
-        values = {'start_time': now + datetime.timedelta(days=101),
+        l1 = api.lease_create(_fresh(test_lease_4, offer_uuid=o1.uuid))
+        values = {'start_time': day[101],
                   'end_time': now}
         self.assertRaises(e.InvalidTimeRange, api.lease_update,
                           l1.uuid, values)
 
     def test_lease_destroy(self):
         o1 = api.offer_create(test_offer_2)
-        test_lease_4['offer_uuid'] = o1.uuid
-        l1 = api.lease_create(test_lease_4)
+        l1 = api.lease_create(_fresh(test_lease_4, offer_uuid=o1.uuid))
         api.lease_destroy(l1.uuid)
-        self.assertEqual(api.lease_get_by_uuid('lease_4'), None)
+        self.assertEqual(api.lease_get_by_uuid(l1.uuid), None)
 
-    def test_lease_destroy_not_found(self):
-        self.assertEqual(api.lease_get_by_uuid('lease_4'), None)
+    def test_lease_destroy_leaves_other_leases(self):
+        o1 = api.offer_create(test_offer_2)
+        l1 = api.lease_create(_fresh(test_lease_3, offer_uuid=o1.uuid))
+        l2 = api.lease_create(_fresh(test_lease_4, offer_uuid=o1.uuid))
+        api.lease_destroy(l1.uuid)
+        self.assertEqual(api.lease_get_by_uuid(l1.uuid), None)
+        self.assertEqual(api.lease_get_by_uuid(l2.uuid).to_dict(),
+                         l2.to_dict())
 
 
 class TestOwnerChangeAPI(base.DBTestCase):
 
-    def setUp(self):
-        super(TestOwnerChangeAPI, self).setUp()
-
-        self.oc1_data = dict(
-            uuid='11111',
-            from_owner_id='owner1',
-            to_owner_id='owner2',
-            resource_uuid='1111',
-            resource_type='dummy_node',
-            start_time=now + datetime.timedelta(days=10),
-            end_time=now + datetime.timedelta(days=20),
-            status=statuses.CREATED,
-        )
-
-        self.oc2_data = dict(
-            uuid='22222',
-            from_owner_id='owner1',
-            to_owner_id='owner3',
-            resource_uuid='1111',
-            resource_type='dummy_node',
-            start_time=now + datetime.timedelta(days=30),
-            end_time=now + datetime.timedelta(days=40),
-            status=statuses.ACTIVE,
-        )
-
-        self.oc3_data = dict(
-            uuid='33333',
-            from_owner_id='owner2',
-            to_owner_id='owner1',
-            resource_uuid='22222',
-            resource_type='dummy_node',
-            start_time=now + datetime.timedelta(days=30),
-            end_time=now + datetime.timedelta(days=40),
-            status=statuses.CREATED,
-        )
+    # shared by every test; pass through dict() to vary a field
+    oc1_data = types.MappingProxyType(dict(
+        uuid='11111',
+        from_owner_id='owner1',
+        to_owner_id='owner2',
+        resource_uuid='1111',
+        resource_type='dummy_node',
+        start_time=day[10],
+        end_time=day[20],
+        status=statuses.CREATED,
+    ))
+
+    oc2_data = types.MappingProxyType(dict(
+        uuid='22222',
+        from_owner_id='owner1',
+        to_owner_id='owner3',
+        resource_uuid='1111',
+        resource_type='dummy_node',
+        start_time=day[30],
+        end_time=day[40],
+        status=statuses.ACTIVE,
+    ))
+
+    oc3_data = types.MappingProxyType(dict(
+        uuid='33333',
+        from_owner_id='owner2',
+        to_owner_id='owner1',
+        resource_uuid='22222',
+        resource_type='dummy_node',
+        start_time=day[30],
+        end_time=day[40],
+        status=statuses.CREATED,
+    ))
 
     def test_owner_change_get_by_uuid(self):
         oc1 = api.owner_change_create(self.oc1_data)
         res = api.owner_change_get_by_uuid(oc1.uuid)
         self.assertEqual(oc1.uuid, res.uuid)
 
-    def test_owner_change_get_by_uuid_not_found(self):
-        assert api.owner_change_get_by_uuid('some_uuid') is None
-
     def test_owner_change_get_all(self):
         oc1 = api.owner_change_create(self.oc1_data)
         oc2 = api.owner_change_create(self.oc2_data)
 
         res = api.owner_change_get_all({})
-        res_uuids = [res_oc.uuid for res_oc in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_oc.uuid for res_oc in res]
 
-        self.assertEqual(2, res.count())
+        self.assertEqual(2, len(res_uuids))
         self.assertIn(oc1.uuid, res_uuids)
         self.assertIn(oc2.uuid, res_uuids)
 
@@ -621,9 +649,10 @@ class TestOwnerChangeAPI(base.DBTestCase):
         oc3 = api.owner_change_create(self.oc3_data)
 
         res = api.owner_change_get_all({'status': [statuses.CREATED]})
-        res_uuids = [res_oc.uuid for res_oc in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_oc.uuid for res_oc in res]
 
-        self.assertEqual(2, res.count())
+        self.assertEqual(2, len(res_uuids))
         self.assertIn(oc1.uuid, res_uuids)
         self.assertIn(oc3.uuid, res_uuids)
 
@@ -632,14 +661,15 @@ class TestOwnerChangeAPI(base.DBTestCase):
         oc2 = api.owner_change_create(self.oc2_data)
         oc3 = api.owner_change_create(self.oc3_data)
 
-        start_time = now + datetime.timedelta(days=32)
-        end_time = now + datetime.timedelta(days=38)
+        start_time = day[32]
+        end_time = day[38]
 
         res = api.owner_change_get_all({'start_time': start_time,
                                         'end_time': end_time})
-        res_uuids = [res_oc.uuid for res_oc in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_oc.uuid for res_oc in res]
 
-        self.assertEqual(2, res.count())
+        self.assertEqual(2, len(res_uuids))
         self.assertIn(oc2.uuid, res_uuids)
         self.assertIn(oc3.uuid, res_uuids)
 
@@ -650,9 +680,10 @@ class TestOwnerChangeAPI(base.DBTestCase):
 
         res = api.owner_change_get_all(
             {'from_or_to_owner_id': oc1.to_owner_id})
-        res_uuids = [res_oc.uuid for res_oc in res]
+        with self.assertQueryCountAtMost(1):
+            res_uuids = [res_oc.uuid for res_oc in res]
 
-        self.assertEqual(2, res.count())
+        self.assertEqual(2, len(res_uuids))
         self.assertIn(oc1.uuid, res_uuids)
         self.assertIn(oc3.uuid, res_uuids)
 
@@ -671,7 +702,7 @@ class TestOwnerChangeAPI(base.DBTestCase):
 
     def test_owner_change_update_invalid_time(self):
         oc1 = api.owner_change_create(self.oc1_data)
-        values = {'start_time': now + datetime.timedelta(days=101),
+        values = {'start_time': day[101],
                   'end_time': now}
 
         self.assertRaises(e.InvalidTimeRange, api.owner_change_update,
@@ -682,80 +713,86 @@ class TestOwnerChangeAPI(base.DBTestCase):
         api.owner_change_destroy(oc1.uuid)
         self.assertEqual(api.owner_change_get_by_uuid(oc1.uuid), None)
 
+    def test_owner_change_destroy_leaves_other_owner_changes(self):
+        oc1 = api.owner_change_create(self.oc1_data)
+        oc2 = api.owner_change_create(self.oc2_data)
+        api.owner_change_destroy(oc1.uuid)
+        self.assertEqual(api.owner_change_get_by_uuid(oc1.uuid), None)
+        self.assertEqual(api.owner_change_get_by_uuid(oc2.uuid).to_dict(),
+                         oc2.to_dict())
+
     def test_owner_change_destroy_not_found(self):
         self.assertRaises(e.OwnerChangeNotFound, api.owner_change_destroy,
                           'someuuid')
 
 
-class TestResourceVeifyAvailabilityAPI(base.DBTestCase):
-
-    def test_resource_verify_availability_offer_conflict(self):
-        o1 = api.offer_create(test_offer_4)
-        r_type = o1.resource_type
-        r_uuid = o1.resource_uuid
+class TestGetByUUIDNotFoundAPI(base.DBTestCase):
 
-        start = test_offer_4['end_time'] + datetime.timedelta(days=1)
-        end = test_offer_4['end_time'] + datetime.timedelta(days=5)
-        api.resource_verify_availability(r_type, r_uuid,
-                                         start, end)
+    def test_get_by_uuid_not_found(self):
+        self.assertIsNone(api.offer_get_by_uuid('some_uuid'))
+        self.assertIsNone(api.lease_get_by_uuid('some_uuid'))
+        self.assertIsNone(api.owner_change_get_by_uuid('some_uuid'))
 
-        start = test_offer_4['start_time'] + datetime.timedelta(days=1)
-        end = test_offer_4['end_time'] + datetime.timedelta(days=-1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
 
-        start = test_offer_4['start_time'] + datetime.timedelta(days=-1)
-        end = test_offer_4['end_time'] + datetime.timedelta(days=1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
+class TestResourceVeifyAvailabilityAPI(base.DBTestCase):
 
-        start = test_offer_4['start_time'] + datetime.timedelta(days=-1)
-        end = test_offer_4['start_time'] + datetime.timedelta(days=1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
+    # (start anchor, start offset, end anchor, end offset, conflicts),
+    # offsets in days from the anchoring time of the existing record
+    cases = [
+        ('end_time', 1, 'end_time', 5, False),
+        ('start_time', 1, 'end_time', -1, True),
+        ('start_time', -1, 'end_time', 1, True),
+        ('start_time', -1, 'start_time', 1, True),
+        ('end_time', -1, 'end_time', 1, True),
+    ]
+
+    def _verify_cases(self, ref):
+        for start_at, start_off, end_at, end_off, conflicts in self.cases:
+            start = getattr(ref, start_at) + \
+                datetime.timedelta(days=start_off)
+            end = getattr(ref, end_at) + datetime.timedelta(days=end_off)
+            with self.subTest(start=(start_at, start_off),
+                              end=(end_at, end_off)), \
+                    self.assertQueryCountAtMost(1):
+                if conflicts:
+                    self.assertRaises(e.ResourceTimeConflict,
+                                      api.resource_verify_availability,
+                                      ref.resource_type, ref.resource_uuid,
+                                      start, end)
+                else:
+                    api.resource_verify_availability(
+                        ref.resource_type, ref.resource_uuid, start, end)
 
-        start = test_offer_4['end_time'] + datetime.timedelta(days=-1)
-        end = test_offer_4['end_time'] + datetime.timedelta(days=1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
+    def test_resource_verify_availability_offer_conflict(self):
+        self._verify_cases(api.offer_create(test_offer_4))
 
     def test_resource_verify_availability_lease_conflict(self):
-        test_lease = api.lease_create(test_lease_1)
-        r_type = test_lease.resource_type
-        r_uuid = test_lease.resource_uuid
-
-        start = test_lease_1['end_time'] + datetime.timedelta(days=1)
-        end = test_lease_1['end_time'] + datetime.timedelta(days=5)
-        api.resource_verify_availability(r_type, r_uuid,
-                                         start, end)
-
-        start = test_lease_1['start_time'] + datetime.timedelta(days=1)
-        end = test_lease_1['end_time'] + datetime.timedelta(days=-1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
+        self._verify_cases(api.lease_create(test_lease_1))
 
-        start = test_lease_1['start_time'] + datetime.timedelta(days=-1)
-        end = test_lease_1['end_time'] + datetime.timedelta(days=1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
-
-        start = test_lease_1['start_time'] + datetime.timedelta(days=-1)
-        end = test_lease_1['start_time'] + datetime.timedelta(days=1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
-
-        start = test_lease_1['end_time'] + datetime.timedelta(days=-1)
-        end = test_lease_1['end_time'] + datetime.timedelta(days=1)
-        self.assertRaises(e.ResourceTimeConflict,
-                          api.resource_verify_availability,
-                          r_type, r_uuid, start, end)
+    def test_resource_verify_availability_bulk(self):
+        o1 = api.offer_create(test_offer_4)
+        l1 = api.lease_create(test_lease_1)
+        free = (o1.resource_type, o1.resource_uuid,
+                o1.end_time, o1.end_time + datetime.timedelta(days=5))
+        offer_conflict = (o1.resource_type, o1.resource_uuid,
+                          o1.start_time, o1.end_time)
+        lease_conflict = (l1.resource_type, l1.resource_uuid,
+                          l1.start_time, l1.end_time)
+
+        with self.assertQueryCountAtMost(1):
+            api.resource_verify_availability_bulk([free, free])
+        api.resource_verify_availability_bulk([])
+
+        for specs, conflict in (([free, offer_conflict], o1),
+                                ([lease_conflict, free], l1),
+                                ([lease_conflict, offer_conflict], l1)):
+            with self.subTest(specs=specs), \
+                    self.assertQueryCountAtMost(1):
+                exc = self.assertRaises(
+                    e.ResourceTimeConflict,
+                    api.resource_verify_availability_bulk, specs)
+                self.assertEqual(conflict.resource_uuid,
+                                 exc.kwargs['resource_uuid'])
 
     def test_resource_verify_availability_owner_change_conflict(self):
         oc1 = api.owner_change_create(dict(
@@ -764,8 +801,8 @@ class TestResourceVeifyAvailabilityAPI(base.DBTestCase):
             to_owner_id='owner2',
             resource_uuid='1111',
             resource_type='dummy_node',
-            start_time=now + datetime.timedelta(days=10),
-            end_time=now + datetime.timedelta(days=20),
+            start_time=day[10],
+            end_time=day[20],
             status=statuses.CREATED,
         ))
 
@@ -783,23 +820,11 @@ class TestResourceVeifyAvailabilityAPI(base.DBTestCase):
 
 class TestResourceCheckAdminAPI(base.DBTestCase):
 
-    def setUp(self):
-        super(TestResourceCheckAdminAPI, self).setUp()
-
-        self.oc1_data = dict(
-            uuid='11111',
-            from_owner_id='owner1',
-            to_owner_id='owner2',
-            resource_uuid='1111',
-            resource_type='dummy_node',
-            start_time=now + datetime.timedelta(days=10),
-            end_time=now + datetime.timedelta(days=20),
-            status=statuses.CREATED,
-        )
+    oc1_data = TestOwnerChangeAPI.oc1_data
 
     def test_resource_check_admin_default(self):
-        start = now + datetime.timedelta(days=11)
-        end = now + datetime.timedelta(days=19)
+        start = day[11]
+        end = day[19]
 
         check = api.resource_check_admin(self.oc1_data['resource_type'],
                                          self.oc1_data['resource_uuid'],
@@ -809,8 +834,8 @@ class TestResourceCheckAdminAPI(base.DBTestCase):
         self.assertTrue(check)
 
     def test_resource_check_admin_default_no_match(self):
-        start = now + datetime.timedelta(days=1)
-        end = now + datetime.timedelta(days=5)
+        start = day[1]
+        end = day[5]
 
         check = api.resource_check_admin(self.oc1_data['resource_type'],
                                          self.oc1_data['resource_uuid'],
@@ -867,6 +892,24 @@ class TestResourceCheckAdminAPI(base.DBTestCase):
 
         self.assertTrue(check)
 
+    def test_resource_check_admin_owner_change_other_owner_changes(self):
+        oc1 = api.owner_change_create(self.oc1_data)
+        api.owner_change_create(TestOwnerChangeAPI.oc2_data)
+        start = oc1.start_time + datetime.timedelta(days=1)
+        end = oc1.end_time + datetime.timedelta(days=-1)
+
+        check = api.resource_check_admin(oc1.resource_type,
+                                         oc1.resource_uuid,
+                                         start, end,
+                                         'owner1', 'owner2')
+        self.assertTrue(check)
+
+        check = api.resource_check_admin(oc1.resource_type,
+                                         oc1.resource_uuid,
+                                         start, day[35],
+                                         'owner1', 'owner2')
+        self.assertFalse(check)
+
     def test_resource_check_admin_owner_change_owner_change_no_match(self):
         oc1 = api.owner_change_create(self.oc1_data)
         start = oc1.start_time + datetime.timedelta(days=1)
@@ -11,8 +11,8 @@
 #    under the License.
 
 import datetime
-import mock
 from oslo_utils import uuidutils
+from unittest import mock
 
 from esi_leap.common import statuses
 from esi_leap.manager.service import ManagerService
@@ -11,10 +11,11 @@
 #    under the License.
 
 import datetime
-import mock
 from oslo_utils import uuidutils
+import shutil
 import tempfile
 import threading
+from unittest import mock
 
 from esi_leap.common import exception
 from esi_leap.common import statuses
@@ -26,6 +27,16 @@ from esi_leap.tests import base
 
 class TestLeaseObject(base.DBTestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super(TestLeaseObject, cls).setUpClass()
+        cls._lock_path = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._lock_path, ignore_errors=True)
+        super(TestLeaseObject, cls).tearDownClass()
+
     def setUp(self):
         super(TestLeaseObject, self).setUp()
 
@@ -73,7 +84,7 @@ class TestLeaseObject(base.DBTestCase):
         self.test_lease_create_offer_dict = self.test_lease_create_dict.copy()
         self.test_lease_create_offer_dict['offer_uuid'] = self.test_offer.uuid
 
-        self.config(lock_path=tempfile.mkdtemp(), group='oslo_concurrency')
+        self.config(lock_path=self._lock_path, group='oslo_concurrency')
 
     def test_get(self):
         lease_uuid = self.test_lease_dict['uuid']
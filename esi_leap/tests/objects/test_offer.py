@@ -10,42 +10,66 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from concurrent import futures
 import datetime
-import mock
 from oslo_utils import uuidutils
+import shutil
 import tempfile
-import threading
+import types
+from unittest import mock
 
 from esi_leap.common import exception
 from esi_leap.common import statuses
+from esi_leap.db.sqlalchemy import api as db_api
 from esi_leap.objects import offer
+from esi_leap.resource_objects import resource_object_factory as ro_factory
 from esi_leap.tests import base
 
 
+_START = datetime.datetime(2016, 7, 16, 19, 20, 30)
+_DAY = {n: _START + datetime.timedelta(days=n)
+        for n in (10, 20, 30, 50, 60, 100, 110)}
+_TEMPLATE_OFFER = types.MappingProxyType({
+    'id': 27,
+    'name': "o",
+    'uuid': '3f2e7b8a-4c1d-4e5f-9a6b-7c8d9e0f1a2b',
+    'project_id': '0wn5r',
+    'lessee_id': None,
+    'resource_type': 'dummy_node',
+    'resource_uuid': '1718',
+    'start_time': _START,
+    'end_time': _DAY[100],
+    'status': statuses.AVAILABLE,
+    'properties': {'floor_price': 3},
+    'created_at': None,
+    'updated_at': None
+})
+
+
 class TestOfferObject(base.DBTestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super(TestOfferObject, cls).setUpClass()
+        cls._lock_path = tempfile.mkdtemp()
+        cls._pool = futures.ThreadPoolExecutor(max_workers=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._pool.shutdown()
+        shutil.rmtree(cls._lock_path, ignore_errors=True)
+        super(TestOfferObject, cls).tearDownClass()
+
     def setUp(self):
         super(TestOfferObject, self).setUp()
 
-        start = datetime.datetime(2016, 7, 16, 19, 20, 30)
-        self.test_offer_data = {
-            'id': 27,
-            'name': "o",
-            'uuid': uuidutils.generate_uuid(),
-            'project_id': '0wn5r',
-            'lessee_id': None,
-            'resource_type': 'dummy_node',
-            'resource_uuid': '1718',
-            'start_time': start,
-            'end_time': start + datetime.timedelta(days=100),
-            'status': statuses.AVAILABLE,
-            'properties': {'floor_price': 3},
-            'created_at': None,
-            'updated_at': None
-        }
-        self.config(lock_path=tempfile.mkdtemp(), group='oslo_concurrency')
+        # properties is the only mutable value in the template
+        self.test_offer_data = dict(
+            _TEMPLATE_OFFER,
+            properties=dict(_TEMPLATE_OFFER['properties']))
+        self.config(lock_path=self._lock_path, group='oslo_concurrency')
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_get_by_uuid')
+    @mock.patch.object(db_api, 'offer_get_by_uuid')
     def test_get(self, mock_offer_get_by_uuid):
         offer_uuid = self.test_offer_data['uuid']
         mock_offer_get_by_uuid.return_value = self.test_offer_data
@@ -55,7 +79,7 @@ class TestOfferObject(base.DBTestCase):
         mock_offer_get_by_uuid.assert_called_once_with(offer_uuid)
         self.assertEqual(self.context, o._context)
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_get_all')
+    @mock.patch.object(db_api, 'offer_get_all')
     def test_get_all(self, mock_offer_get_all):
         mock_offer_get_all.return_value = [
             self.test_offer_data]
@@ -67,42 +91,59 @@ class TestOfferObject(base.DBTestCase):
         self.assertIsInstance(offers[0], offer.Offer)
         self.assertEqual(self.context, offers[0]._context)
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_get_conflict_times')
+    @mock.patch.object(db_api, 'offer_get_conflict_times')
     def test_get_availabilities(self, mock_offer_get_conflict_times):
         o = offer.Offer(
             self.context, **self.test_offer_data)
         mock_offer_get_conflict_times.return_value = [
             [
-                o.start_time + datetime.timedelta(days=10),
-                o.start_time + datetime.timedelta(days=20)
+                _DAY[10],
+                _DAY[20]
             ],
             [
-                o.start_time + datetime.timedelta(days=20),
-                o.start_time + datetime.timedelta(days=30)
+                _DAY[20],
+                _DAY[30]
             ],
             [
-                o.start_time + datetime.timedelta(days=50),
-                o.start_time + datetime.timedelta(days=60)
+                _DAY[50],
+                _DAY[60]
             ]
         ]
 
         expect = [
             [
                 o.start_time,
-                o.start_time + datetime.timedelta(days=10)
+                _DAY[10]
             ],
             [
-                o.start_time + datetime.timedelta(days=30),
-                o.start_time + datetime.timedelta(days=50)
+                _DAY[30],
+                _DAY[50]
             ],
             [
-                o.start_time + datetime.timedelta(days=60),
+                _DAY[60],
                 o.end_time
             ],
         ]
         a = o.get_availabilities()
         self.assertEqual(a, expect)
 
+        mock_offer_get_conflict_times.return_value = [
+            [
+                _DAY[50],
+                _DAY[60]
+            ],
+            [
+                _DAY[10],
+                _DAY[20]
+            ],
+            [
+                _DAY[20],
+                _DAY[30]
+            ]
+        ]
+        a = o.get_availabilities()
+        self.assertEqual(a, expect)
+
         mock_offer_get_conflict_times.return_value = [
             [
                 o.start_time,
@@ -125,24 +166,66 @@ class TestOfferObject(base.DBTestCase):
         a = o.get_availabilities()
         self.assertEqual(a, expect)
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.resource_verify_availability')
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_create')
-    def test_create(self, mock_oc, mock_rva):
+    @mock.patch.object(db_api, 'offer_get_conflict_times')
+    def test_get_availabilities_with_conflicts(self,
+                                               mock_offer_get_conflict_times):
+        o = offer.Offer(
+            self.context, **self.test_offer_data)
+        conflicts = [
+            (_DAY[10],
+             _DAY[20]),
+        ]
+
+        expect = [
+            [
+                o.start_time,
+                _DAY[10]
+            ],
+            [
+                _DAY[20],
+                o.end_time
+            ],
+        ]
+        a = o.get_availabilities(conflicts)
+        self.assertEqual(a, expect)
+        mock_offer_get_conflict_times.assert_not_called()
+
+    @mock.patch.object(db_api, 'offer_get_all_with_conflict_times')
+    def test_get_all_with_conflict_times(self, mock_ogawct):
+        conflicts = [(self.test_offer_data['start_time'],
+                      self.test_offer_data['end_time'])]
+        mock_ogawct.return_value = [(self.test_offer_data, conflicts)]
+
+        offers = offer.Offer.get_all_with_conflict_times({}, self.context)
+
+        mock_ogawct.assert_called_once_with({})
+        self.assertEqual(len(offers), 1)
+        self.assertIsInstance(offers[0][0], offer.Offer)
+        self.assertEqual(self.context, offers[0][0]._context)
+        self.assertEqual(conflicts, offers[0][1])
+
+    @mock.patch.object(db_api, 'offer_create')
+    def test_create(self, mock_oc):
         o = offer.Offer(
             self.context, **self.test_offer_data)
         mock_oc.return_value = self.test_offer_data
 
         o.create(self.context)
 
-        mock_rva.assert_called_once_with(o.resource_type,
-                                         o.resource_uuid,
-                                         o.start_time,
-                                         o.end_time,
-                                         is_owner_change=False)
-        mock_oc.assert_called_once_with(self.test_offer_data)
+        mock_oc.assert_called_once_with(self.test_offer_data,
+                                        verify_availability=True)
+
+    @mock.patch.object(db_api, 'resource_verify_availability_bulk')
+    def test_create_conflict(self, mock_rva):
+        mock_rva.side_effect = exception.ResourceTimeConflict(
+            resource_type='dummy_node', resource_uuid='1718')
+        o = offer.Offer(
+            self.context, **self.test_offer_data)
+
+        self.assertRaises(exception.ResourceTimeConflict, o.create)
+        self.assertEqual([], offer.Offer.get_all({}, self.context))
 
     def test_create_invalid_time(self):
-        start = self.test_offer_data['start_time']
         bad_offer = {
             'id': 27,
             'name': "o",
@@ -150,8 +233,8 @@ class TestOfferObject(base.DBTestCase):
             'project_id': '0wn5r',
             'resource_type': 'dummy_node',
             'resource_uuid': '1718',
-            'start_time': start + datetime.timedelta(days=100),
-            'end_time': start,
+            'start_time': _DAY[100],
+            'end_time': _START,
             'status': statuses.AVAILABLE,
             'properties': {'floor_price': 3},
             'created_at': None,
@@ -163,40 +246,52 @@ class TestOfferObject(base.DBTestCase):
 
         self.assertRaises(exception.InvalidTimeRange, o.create)
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.resource_verify_availability')
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_create')
-    def test_create_concurrent(self, mock_oc, mock_rva):
-        o = offer.Offer(
-            self.context, **self.test_offer_data)
-        o2 = offer.Offer(
-            self.context, **self.test_offer_data)
-
-        o2.id = 28
+    @mock.patch.object(db_api, 'offer_create_many')
+    def test_create_many(self, mock_ocm):
+        o = offer.Offer(self.context, **self.test_offer_data)
+        data_2 = dict(self.test_offer_data, id=28,
+                      uuid=uuidutils.generate_uuid(),
+                      start_time=self.test_offer_data['end_time'],
+                      end_time=_DAY[110])
+        o2 = offer.Offer(self.context, **data_2)
+        mock_ocm.return_value = [self.test_offer_data, data_2]
 
-        def update_mock(updates):
-            mock_rva.side_effect = Exception("bad")
+        offer.Offer.create_many([o, o2], self.context)
 
-        mock_oc.side_effect = update_mock
+        mock_ocm.assert_called_once_with([self.test_offer_data, data_2],
+                                         verify_availability=True)
+        self.assertEqual(28, o2.id)
 
-        thread = threading.Thread(target=o.create)
-        thread2 = threading.Thread(target=o2.create)
+    @mock.patch.object(db_api, 'offer_create_many')
+    def test_create_many_overlapping(self, mock_ocm):
+        o = offer.Offer(self.context, **self.test_offer_data)
+        o2 = offer.Offer(self.context, **dict(
+            self.test_offer_data, id=28, uuid=uuidutils.generate_uuid()))
 
-        thread.start()
-        thread2.start()
+        self.assertRaises(exception.ResourceTimeConflict,
+                          offer.Offer.create_many, [o, o2], self.context)
+        mock_ocm.assert_not_called()
 
-        thread.join()
-        thread2.join()
+    def test_create_concurrent(self):
+        o = offer.Offer(
+            self.context, **self.test_offer_data)
+        o2 = offer.Offer(
+            self.context, **dict(self.test_offer_data, id=28,
+                                 uuid=uuidutils.generate_uuid()))
+        results = [self._pool.submit(o.create), self._pool.submit(o2.create)]
+        errors = [r.exception() for r in results if r.exception()]
 
-        assert mock_rva.call_count == 2
-        mock_oc.assert_called_once()
+        self.assertEqual(1, len(errors))
+        self.assertIsInstance(errors[0], exception.ResourceTimeConflict)
+        self.assertEqual(1, len(offer.Offer.get_all({}, self.context)))
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_destroy')
+    @mock.patch.object(db_api, 'offer_destroy')
     def test_destroy(self, mock_offer_destroy):
         o = offer.Offer(self.context, **self.test_offer_data)
         o.destroy()
         mock_offer_destroy.assert_called_once_with(o.uuid)
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_update')
+    @mock.patch.object(db_api, 'offer_update')
     def test_save(self, mock_offer_update):
         o = offer.Offer(self.context, **self.test_offer_data)
         new_status = statuses.CANCELLED
@@ -217,14 +312,25 @@ class TestOfferObject(base.DBTestCase):
         self.assertEqual(self.context, o._context)
         self.assertEqual(updated_at, o.updated_at)
 
-    @mock.patch('esi_leap.db.sqlalchemy.api.offer_verify_availability')
+    @mock.patch.object(db_api, 'offer_update')
+    def test_save_only_changes(self, mock_offer_update):
+        o = offer.Offer._from_db_object(
+            self.context, offer.Offer(), self.test_offer_data)
+        mock_offer_update.return_value = self.test_offer_data
+
+        o.status = statuses.CANCELLED
+        o.save(self.context)
+
+        mock_offer_update.assert_called_once_with(
+            o.uuid, {'status': statuses.CANCELLED})
+
+    @mock.patch.object(db_api, 'offer_verify_availability')
     def test_verify_availability(self, mock_ova):
         o = offer.Offer(self.context, **self.test_offer_data)
         o.verify_availability(o.start_time, o.end_time)
         mock_ova.assert_called_once_with(o, o.start_time, o.end_time)
 
-    @mock.patch('esi_leap.resource_objects.resource_object_factory.'
-                'ResourceObjectFactory.get_resource_object')
+    @mock.patch.object(ro_factory.ResourceObjectFactory, 'get_resource_object')
     def test_resource_object(self, mock_gro):
         o = offer.Offer(self.context, **self.test_offer_data)
         o.resource_object()
@@ -11,10 +11,11 @@
 #    under the License.
 
 import datetime
-import mock
 from oslo_utils import uuidutils
+import shutil
 import tempfile
 import threading
+from unittest import mock
 
 from esi_leap.common import exception
 from esi_leap.common import statuses
@@ -27,6 +28,16 @@ from esi_leap.tests import base
 
 class TestOwnerChangeObject(base.DBTestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super(TestOwnerChangeObject, cls).setUpClass()
+        cls._lock_path = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._lock_path, ignore_errors=True)
+        super(TestOwnerChangeObject, cls).tearDownClass()
+
     def setUp(self):
         super(TestOwnerChangeObject, self).setUp()
 
@@ -61,7 +72,7 @@ class TestOwnerChangeObject(base.DBTestCase):
             'created_at': None,
             'updated_at': None
         }
-        self.config(lock_path=tempfile.mkdtemp(), group='oslo_concurrency')
+        self.config(lock_path=self._lock_path, group='oslo_concurrency')
 
     @mock.patch('esi_leap.db.sqlalchemy.api.owner_change_get_by_uuid')
     def test_get(self, mock_ocgbu):
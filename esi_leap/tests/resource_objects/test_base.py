@@ -14,7 +14,7 @@ import datetime
 from esi_leap.resource_objects import ironic_node
 from esi_leap.resource_objects import test_node
 from esi_leap.tests import base
-import mock
+from unittest import mock
 
 
 class TestResourceObjectInterface(base.TestCase):
@@ -14,7 +14,7 @@ from esi_leap.common import statuses
 from esi_leap.resource_objects import dummy_node
 from esi_leap.tests import base
 import json
-import mock
+from unittest import mock
 
 
 start = datetime.datetime(2016, 7, 16, 19, 20, 30)
@@ -10,10 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import datetime
+import threading
+
 from esi_leap.common import statuses
 from esi_leap.resource_objects import ironic_node
 from esi_leap.tests import base
-import mock
+from unittest import mock
 
 start = datetime.datetime(2016, 7, 16, 19, 20, 30)
 
@@ -42,9 +44,34 @@ class TestIronicNode(base.TestCase):
 
     def setUp(self):
         super(TestIronicNode, self).setUp()
+        ironic_node._node_cache.clear()
+        self.addCleanup(ironic_node._node_cache.clear)
         self.fake_admin_project_id_1 = '123'
         self.fake_admin_project_id_2 = '123456'
 
+    @mock.patch.object(ironic_node.ks_loading,
+                       'load_session_from_conf_options', autospec=True)
+    @mock.patch.object(ironic_node.ks_loading,
+                       'load_auth_from_conf_options', autospec=True)
+    @mock.patch.object(ironic_node.ironic_client, 'get_client',
+                       autospec=True)
+    def test_get_ironic_client_concurrent(self, mock_get_client,
+                                          mock_load_auth, mock_load_session):
+        self.addCleanup(setattr, ironic_node, '_cached_ironic_client',
+                        ironic_node._cached_ironic_client)
+        ironic_node._cached_ironic_client = None
+
+        threads = [threading.Thread(target=ironic_node.get_ironic_client)
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_get_client.assert_called_once()
+        self.assertEqual(mock_get_client.return_value,
+                         ironic_node.get_ironic_client())
+
     def test_resource_type(self):
         test_ironic_node = ironic_node.IronicNode("1111")
         self.assertEqual("ironic_node", test_ironic_node.resource_type)
@@ -74,6 +101,17 @@ class TestIronicNode(base.TestCase):
         client_mock.return_value.node.get.assert_called_once_with(
             test_ironic_node._uuid)
 
+    @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
+    def test_get_lease_uuid_ignores_cache(self, client_mock):
+        cached_node = FakeIronicNode()
+        cached_node.properties = {}
+        client_mock.return_value.node.get.return_value = cached_node
+        test_ironic_node = ironic_node.IronicNode("1111")
+        test_ironic_node.get_project_id()
+
+        client_mock.return_value.node.get.return_value = FakeIronicNode()
+        self.assertEqual("001", test_ironic_node.get_lease_uuid())
+
     @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
     def test_get_project_id(self, client_mock):
         fake_get_node = FakeIronicNode()
@@ -109,40 +147,47 @@ class TestIronicNode(base.TestCase):
 
     @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
     def test_expire_lease(self, client_mock):
-        client_mock.return_value.node.get.return_value.\
-            provision_state = "active"
-        with mock.patch.object(
-            ironic_node.IronicNode, 'get_lease_uuid', autospec=True
-        ) as mock_lease_uuid_true:
-            fake_lease = FakeLease()
-            mock_lease_uuid_true.return_value = fake_lease.uuid
-            with mock.patch.object(
-                ironic_node.IronicNode, 'get_project_id', autospec=True
-            ) as mock_project_id_get:
-                mock_project_id_get.return_value = \
-                    fake_lease.project_id
-
-                test_ironic_node = ironic_node.IronicNode("1111")
-                test_ironic_node.expire_lease(fake_lease)
-
-                mock_project_id_get.assert_called_once()
-                self.assertEqual(mock_lease_uuid_true.call_count, 2)
-                self.assertEqual(client_mock.call_count, 3)
-                client_mock.return_value.node.update.assert_called_once()
-                client_mock.return_value.node.get.assert_called_once_with(
-                    test_ironic_node._uuid)
-                client_mock.return_value.node.set_provision_state.\
-                    assert_called_once_with(
-                        test_ironic_node._uuid, "deleted")
-
-        with mock.patch.object(
-            ironic_node.IronicNode, 'get_lease_uuid', autospec=True
-        ) as mock_lease_uuid_false:
-            mock_lease_uuid_false.return_value = "none"
-            test_ironic_node = ironic_node.IronicNode("1111")
-            fake_lease = FakeLease()
-            test_ironic_node.expire_lease(fake_lease)
-            mock_lease_uuid_false.assert_called_once()
+        fake_get_node = FakeIronicNode()
+        fake_get_node.provision_state = "active"
+        client_mock.return_value.node.get.return_value = fake_get_node
+        test_ironic_node = ironic_node.IronicNode("1111")
+        test_ironic_node.expire_lease(FakeLease())
+
+        client_mock.return_value.node.update.assert_called_once_with(
+            "1111", [{"op": "remove", "path": "/properties/lease_uuid"},
+                     {"op": "remove", "path": "/lessee"}])
+        self.assertEqual(2, client_mock.return_value.node.get.call_count)
+        client_mock.return_value.node.set_provision_state.\
+            assert_called_once_with("1111", "deleted")
+
+    @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
+    def test_expire_lease_other_lease(self, client_mock):
+        fake_get_node = FakeIronicNode()
+        fake_get_node.properties = {"lease_uuid": "none"}
+        client_mock.return_value.node.get.return_value = fake_get_node
+        test_ironic_node = ironic_node.IronicNode("1111")
+        test_ironic_node.expire_lease(FakeLease())
+
+        client_mock.return_value.node.update.assert_not_called()
+        client_mock.return_value.node.set_provision_state.assert_not_called()
+
+    @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
+    def test_expire_lease_ignores_cache(self, client_mock):
+        cached_node = FakeIronicNode()
+        cached_node.properties = {}
+        client_mock.return_value.node.get.return_value = cached_node
+        test_ironic_node = ironic_node.IronicNode("1111")
+        test_ironic_node.get_project_id()
+
+        # the lease was set and the node deployed behind the cache's back
+        fake_get_node = FakeIronicNode()
+        fake_get_node.provision_state = "active"
+        client_mock.return_value.node.get.return_value = fake_get_node
+        test_ironic_node.expire_lease(FakeLease())
+
+        client_mock.return_value.node.update.assert_called_once()
+        client_mock.return_value.node.set_provision_state.\
+            assert_called_once_with("1111", "deleted")
 
     @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
     def test_set_owner(self, client_mock):
@@ -158,3 +203,24 @@ class TestIronicNode(base.TestCase):
         test_ironic_node = ironic_node.IronicNode("1111")
         self.assertEqual(self.fake_admin_project_id_2,
                          test_ironic_node.resource_admin_project_id())
+
+    @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
+    def test_node_cached(self, client_mock):
+        fake_get_node = FakeIronicNode()
+        client_mock.return_value.node.get.return_value = fake_get_node
+        test_ironic_node = ironic_node.IronicNode("1111")
+        self.assertEqual(fake_get_node.lessee,
+                         test_ironic_node.get_project_id())
+        self.assertEqual(fake_get_node.owner,
+                         test_ironic_node.resource_admin_project_id())
+        client_mock.return_value.node.get.assert_called_once_with("1111")
+
+    @mock.patch.object(ironic_node, 'get_ironic_client', autospec=True)
+    def test_node_cache_invalidated_on_update(self, client_mock):
+        fake_get_node = FakeIronicNode()
+        client_mock.return_value.node.get.return_value = fake_get_node
+        test_ironic_node = ironic_node.IronicNode("1111")
+        test_ironic_node.get_project_id()
+        test_ironic_node.set_owner('54321')
+        test_ironic_node.get_project_id()
+        self.assertEqual(2, client_mock.return_value.node.get.call_count)
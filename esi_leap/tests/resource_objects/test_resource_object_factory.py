@@ -10,7 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import mock
+from unittest import mock
 
 from esi_leap.common import exception
 from esi_leap import resource_objects
@@ -22,6 +22,10 @@ class TestResourceObjectFactory(base.TestCase):
 
     def setUp(self):
         super(TestResourceObjectFactory, self).setUp()
+        ro_factory._node_uuid_cache.clear()
+        self.addCleanup(ro_factory._node_uuid_cache.clear)
+        ro_factory._resource_object_cache.clear()
+        self.addCleanup(ro_factory._resource_object_cache.clear)
 
     @mock.patch('oslo_utils.uuidutils.is_uuid_like')
     def test_ironic_node(self, mock_iul):
@@ -48,6 +52,17 @@ class TestResourceObjectFactory(base.TestCase):
                                    resource_objects.ironic_node.IronicNode))
         self.assertEqual("1111", node.get_resource_uuid())
 
+    @mock.patch('esi_leap.resource_objects.ironic_node.IronicNode.get_by_name')
+    def test_ironic_node_by_name_cached(self, mock_gbn):
+        mock_gbn.return_value = resource_objects.ironic_node.IronicNode('1111')
+        nodes = [ro_factory.ResourceObjectFactory.get_resource_object(
+            'ironic_node', 'node-name') for i in range(2)]
+
+        mock_gbn.assert_called_once_with('node-name')
+        self.assertEqual("1111", nodes[0].get_resource_uuid())
+        # the miss and the hit hand out the same shared instance
+        self.assertIs(nodes[0], nodes[1])
+
     def test_dummy_node(self):
         node = ro_factory.ResourceObjectFactory.get_resource_object(
             'dummy_node', '1111')
@@ -62,6 +77,16 @@ class TestResourceObjectFactory(base.TestCase):
                                    resource_objects.test_node.TestNode))
         self.assertEqual("1111", node.get_resource_uuid())
 
+    def test_resource_object_shared(self):
+        node = ro_factory.ResourceObjectFactory.get_resource_object(
+            'dummy_node', '1111')
+        self.assertIs(node, ro_factory.ResourceObjectFactory.
+                      get_resource_object('dummy_node', '1111'))
+        self.assertIsNot(node, ro_factory.ResourceObjectFactory.
+                         get_resource_object('dummy_node', '2222'))
+        self.assertIsNot(node, ro_factory.ResourceObjectFactory.
+                         get_resource_object('test_node', '1111'))
+
     def test_unknown_resource_type(self):
         self.assertRaises(exception.ResourceTypeUnknown,
                           ro_factory.ResourceObjectFactory.